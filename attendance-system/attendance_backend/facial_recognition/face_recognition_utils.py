@@ -1,18 +1,411 @@
 import face_recognition
+import dlib
 import cv2
 import numpy as np
 import json
 import base64
 from PIL import Image, ImageEnhance, ImageFilter, ImageOps, ImageDraw, ImageStat
-import io
+import os
 import time
+import hashlib
+import tempfile
+import threading
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from scipy.spatial import distance
+from django.conf import settings
+from django.db.models import Count, Max
 from .models import Employee
 import logging
 
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se usa el json estándar
+    orjson = None
+
+try:
+    import hnswlib
+except ImportError:  # hnswlib es opcional: sin él se compara contra todos los encodings
+    hnswlib = None
+
 logger = logging.getLogger(__name__)
 
+# Las redes de dlib (detector CNN y encoder) reutilizan buffers internos y no admiten
+# llamadas concurrentes: se serializan cuando la verificación corre en varios hilos
+_DLIB_NET_LOCK = threading.Lock()
+
+
+# La detección CNN por lotes solo compensa cuando dlib está compilado con CUDA
+CNN_BATCH_AVAILABLE = bool(getattr(dlib, 'DLIB_USE_CUDA', False))
+
+
+def face_encodings_locked(*args, **kwargs):
+    """face_recognition.face_encodings protegido contra llamadas concurrentes"""
+    with _DLIB_NET_LOCK:
+        return face_recognition.face_encodings(*args, **kwargs)
+
+
+def cnn_face_locations_locked(image_array):
+    """Detección CNN de face_recognition protegida contra llamadas concurrentes"""
+    with _DLIB_NET_LOCK:
+        return face_recognition.face_locations(image_array, model="cnn")
+
+
+def batch_cnn_face_locations_locked(image_arrays):
+    """Detección CNN de varias imágenes (del mismo tamaño) en una sola llamada a la GPU"""
+    with _DLIB_NET_LOCK:
+        return face_recognition.batch_face_locations(
+            image_arrays, number_of_times_to_upsample=1, batch_size=len(image_arrays)
+        )
+
+
+def normalize_rows(vectors):
+    """Normaliza a norma L2 unitaria un vector o cada fila de una matriz (NaN si la norma es 0)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def decode_base64_image(photo_base64, flags=cv2.IMREAD_COLOR):
+    """Decodifica una imagen base64 (con o sin prefijo data URL) con OpenCV; None si es inválida"""
+    if ',' in photo_base64:
+        photo_base64 = photo_base64.split(',', 1)[1]
+    try:
+        image_data = base64.b64decode(photo_base64)
+    except (ValueError, TypeError):
+        return None
+    return cv2.imdecode(np.frombuffer(image_data, np.uint8), flags)
+
+
+def resize_to_max_side(image_array, max_side):
+    """Reduce la imagen (sin ampliarla) para que su lado mayor no supere max_side"""
+    height, width = image_array.shape[:2]
+    scale = min(1.0, max_side / float(max(height, width)))
+    if scale < 1.0:
+        return cv2.resize(image_array, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return image_array
+
+
+def dumps_face_data(face_data):
+    """Serializa los datos de rostro de un registro para Employee.face_encoding"""
+    if orjson is None:
+        return json.dumps(face_data)
+    return orjson.dumps(face_data, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+
+
+def loads_face_data(face_encoding):
+    """Inverso de dumps_face_data (también lee los registros guardados con json estándar)"""
+    if orjson is None:
+        return json.loads(face_encoding)
+    return orjson.loads(face_encoding)
+
+
+def pack_encodings(encodings):
+    """Serializa encodings faciales como base64 de float32 (512 bytes por encoding)"""
+    return base64.b64encode(np.asarray(encodings, dtype=np.float32).tobytes()).decode('ascii')
+
+
+def unpack_encodings(encodings_b64):
+    """Inverso de pack_encodings: matriz float32 (M, 128) de solo lectura"""
+    return np.frombuffer(base64.b64decode(encodings_b64), dtype=np.float32).reshape(-1, 128)
+
+
+def prepare_stored_face_data(stored_data):
+    """Agrega a los datos de rostro guardados la matriz float32 (M, 128) de sus encodings válidos"""
+    if 'encoding_matrix' in stored_data:
+        return stored_data
+    
+    if 'encodings_b64' in stored_data:
+        stored_data['encoding_matrix'] = unpack_encodings(stored_data['encodings_b64'])
+        stored_data['encoding_indices'] = list(range(len(stored_data['encoding_matrix'])))
+    else:
+        # Registros anteriores: lista JSON de floats
+        stored_encodings = stored_data.get('encodings', [])
+        valid_indices = [i for i, enc in enumerate(stored_encodings) if enc is not None]
+        stored_data['encoding_indices'] = valid_indices
+        stored_data['encoding_matrix'] = np.asarray(
+            [stored_encodings[i] for i in valid_indices], dtype=np.float32
+        ).reshape(len(valid_indices), -1)
+    
+    return stored_data
+
+
+# Clasificador Haar por hilo: detectMultiScale no debe compartirse entre hilos
+_HAAR_STATE = threading.local()
+
+
+def _get_face_cascade():
+    """Clasificador Haar de rostros frontales del hilo actual (None si no se pudo cargar)"""
+    if not hasattr(_HAAR_STATE, 'cascade'):
+        cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+        _HAAR_STATE.cascade = None if cascade.empty() else cascade
+    return _HAAR_STATE.cascade
+
+
+# Búsqueda aproximada (HNSW) de vecinos: solo compensa con muchos encodings registrados
+ANN_MIN_ENCODINGS = 500
+ANN_NEIGHBORS = 32
+
+
+def build_ann_index(matrix):
+    """Índice HNSW (L2) sobre las filas de la matriz de encodings, o None si no corresponde"""
+    if hnswlib is None or len(matrix) < ANN_MIN_ENCODINGS:
+        return None
+    
+    ann_index = hnswlib.Index(space='l2', dim=matrix.shape[1])
+    ann_index.init_index(max_elements=len(matrix), ef_construction=200, M=16)
+    ann_index.add_items(matrix, np.arange(len(matrix)))
+    _configure_ann_index(ann_index)
+    return ann_index
+
+
+def load_ann_index(path, matrix):
+    """Carga un índice HNSW guardado con save_index(), o None si no se puede usar"""
+    if hnswlib is None or len(matrix) < ANN_MIN_ENCODINGS:
+        return None
+    
+    ann_index = hnswlib.Index(space='l2', dim=matrix.shape[1])
+    try:
+        ann_index.load_index(path, max_elements=len(matrix))
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"No se pudo cargar el índice HNSW {path}: {e}")
+        return None
+    if ann_index.get_current_count() != len(matrix):
+        return None
+    _configure_ann_index(ann_index)
+    return ann_index
+
+
+def _configure_ann_index(ann_index):
+    """Parámetros de consulta del índice HNSW (no se guardan con save_index)"""
+    ann_index.set_ef(max(64, ANN_NEIGHBORS))
+    # Las consultas llegan desde varios hilos de request: sin pool interno por consulta
+    ann_index.set_num_threads(1)
+
+
+# Caché en proceso de los rostros registrados: evita consultar y decodificar el JSON
+# de encodings de todos los empleados en cada verificación. Se reconstruye cuando se
+# registra un rostro en este proceso (version) o cambia la tabla de empleados (firma)
+_ENCODING_CACHE = {'version': 0, 'key': None, 'faces': None}
+_ENCODING_CACHE_LOCK = threading.Lock()
+
+# Snapshot en disco de la matriz de encodings compartido por los workers del servidor
+FACE_CACHE_DIR = str(getattr(
+    settings, 'FACE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'attendance_face_cache')
+))
+
+
+def invalidate_encoding_cache():
+    """Fuerza la reconstrucción de la caché de encodings en la próxima verificación"""
+    with _ENCODING_CACHE_LOCK:
+        _ENCODING_CACHE['version'] += 1
+
+
+def get_employee_face_data(employee):
+    """
+    Datos de rostro completos (landmarks, adaptaciones) de un empleado de la caché.
+    Cuando la caché se cargó desde el snapshot en disco se leen de la BD la primera vez.
+    """
+    if employee['face_data'] is None:
+        face_encoding = Employee.objects.filter(id=employee['id']).values_list(
+            'face_encoding', flat=True
+        ).first()
+        employee['face_data'] = (
+            prepare_stored_face_data(loads_face_data(face_encoding)) if face_encoding else {}
+        )
+    return employee['face_data']
+
+
+def _snapshot_signature(stats):
+    """Firma JSON de la tabla de empleados con rostro: valida el snapshot en disco"""
+    last_update = stats['last_update'].isoformat() if stats['last_update'] else None
+    return [last_update, stats['total']]
+
+
+# Matrices del snapshot: la cruda y sus versiones normalizada y centrada (filas unitarias)
+SNAPSHOT_MATRICES = ('matrix', 'unit_matrix', 'centered_matrix')
+
+
+def build_face_matrices(matrix):
+    """Matriz de encodings más sus versiones normalizada y centrada, todas contiguas"""
+    return {
+        'matrix': matrix,
+        'unit_matrix': np.ascontiguousarray(normalize_rows(matrix)),
+        'centered_matrix': np.ascontiguousarray(
+            normalize_rows(matrix - matrix.mean(axis=1, keepdims=True))
+        ),
+    }
+
+
+def _load_faces_snapshot(signature):
+    """
+    Carga (employees, matrices, row_counts, ann_index) del snapshot en disco si corresponde
+    a la firma actual. Las tres matrices se abren con mmap: los workers comparten las páginas
+    del archivo; el índice HNSW se lee del archivo guardado en vez de reconstruirse.
+    """
+    meta_path = os.path.join(FACE_CACHE_DIR, 'face_matrix_meta.json')
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        if meta['signature'] != signature:
+            return None
+        matrices = {
+            name: np.load(os.path.join(FACE_CACHE_DIR, meta['matrix_files'][name]), mmap_mode='r')
+            for name in SNAPSHOT_MATRICES
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    
+    if any(len(array) != sum(meta['row_counts']) for array in matrices.values()):
+        return None
+    
+    ann_index = None
+    if meta.get('ann_file'):
+        ann_index = load_ann_index(os.path.join(FACE_CACHE_DIR, meta['ann_file']), matrices['matrix'])
+    if ann_index is None:
+        # Snapshot guardado sin hnswlib (o índice ilegible): se construye en este worker
+        ann_index = build_ann_index(matrices['matrix'])
+    
+    employees = [dict(emp, face_data=None) for emp in meta['employees']]
+    return employees, matrices, meta['row_counts'], ann_index
+
+
+def _save_faces_snapshot(signature, employees, matrices, row_counts, ann_index):
+    """Guarda las matrices (.npy), el índice HNSW y los metadatos para el arranque de otros workers"""
+    try:
+        os.makedirs(FACE_CACHE_DIR, exist_ok=True)
+        digest = hashlib.sha1(json.dumps(signature).encode()).hexdigest()[:16]
+        
+        # Escritura atómica: archivo temporal + os.replace; el .json se reemplaza al final
+        matrix_files = {}
+        for name in SNAPSHOT_MATRICES:
+            matrix_files[name] = f"face_matrix_{digest}_{name}.npy"
+            fd, tmp_path = tempfile.mkstemp(dir=FACE_CACHE_DIR, suffix='.npy')
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.save(tmp_file, matrices[name])
+            os.replace(tmp_path, os.path.join(FACE_CACHE_DIR, matrix_files[name]))
+        
+        ann_file = None
+        if ann_index is not None:
+            ann_file = f"face_ann_{digest}.bin"
+            fd, tmp_path = tempfile.mkstemp(dir=FACE_CACHE_DIR, suffix='.bin')
+            os.close(fd)
+            ann_index.save_index(tmp_path)
+            os.replace(tmp_path, os.path.join(FACE_CACHE_DIR, ann_file))
+        
+        meta = {
+            'signature': signature,
+            'matrix_files': matrix_files,
+            'ann_file': ann_file,
+            'row_counts': row_counts,
+            'employees': [
+                {key: str(emp[key]) for key in ('id', 'name', 'employee_id', 'rut', 'department')}
+                for emp in employees
+            ],
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=FACE_CACHE_DIR, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+            json.dump(meta, tmp_file)
+        os.replace(tmp_path, os.path.join(FACE_CACHE_DIR, 'face_matrix_meta.json'))
+        
+        current_files = set(matrix_files.values()) | {ann_file}
+        for name in os.listdir(FACE_CACHE_DIR):
+            is_snapshot_file = (
+                (name.startswith('face_matrix_') and name.endswith('.npy')) or
+                (name.startswith('face_ann_') and name.endswith('.bin'))
+            )
+            if is_snapshot_file and name not in current_files:
+                os.remove(os.path.join(FACE_CACHE_DIR, name))
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"No se pudo guardar el snapshot de encodings: {e}")
+
+
+def _load_registered_employees(registered):
+    """Lee de la BD y decodifica los datos de rostro de los empleados registrados"""
+    employees = []
+    for employee in registered.only(
+        'id', 'name', 'employee_id', 'rut', 'department', 'face_encoding'
+    ).iterator():
+        if not employee.face_encoding:
+            continue
+        try:
+            stored_data = prepare_stored_face_data(loads_face_data(employee.face_encoding))
+        except (ValueError, TypeError) as e:
+            logger.error(f"Encoding inválido para {employee.name}: {e}")
+            continue
+        if not stored_data['encoding_indices']:
+            continue
+        employees.append({
+            'id': employee.id,
+            'name': employee.name,
+            'employee_id': employee.employee_id,
+            'rut': employee.rut,
+            'department': employee.department,
+            'face_data': stored_data,
+        })
+    
+    if employees:
+        matrix = np.ascontiguousarray(
+            np.vstack([emp['face_data']['encoding_matrix'] for emp in employees])
+        )
+        row_counts = [len(emp['face_data']['encoding_indices']) for emp in employees]
+    else:
+        matrix = np.empty((0, 128), dtype=np.float32)
+        row_counts = []
+    return employees, matrix, row_counts
+
+
+def get_registered_faces():
+    """
+    Empleados activos con rostro registrado y sus datos de rostro ya decodificados.
+    Incluye los encodings de todos los empleados apilados en una matriz float32
+    contigua (`matrix`, más sus versiones normalizada y centrada) para comparar la
+    foto contra todos con un solo producto matriz-vector; las filas de cada empleado
+    van de `row_starts[i]` a `row_ends[i]`. Con muchos encodings y hnswlib instalado
+    incluye además un índice HNSW (`ann_index`) para preseleccionar candidatos.
+    Los datos completos de cada empleado se obtienen con get_employee_face_data().
+    """
+    registered = Employee.objects.filter(is_active=True, has_face_registered=True)
+    stats = registered.aggregate(last_update=Max('updated_at'), total=Count('id'))
+    
+    with _ENCODING_CACHE_LOCK:
+        key = (_ENCODING_CACHE['version'], stats['last_update'], stats['total'])
+        if _ENCODING_CACHE['key'] == key:
+            return _ENCODING_CACHE['faces']
+        
+        # Otro worker ya decodificó esta misma versión: se reutiliza su snapshot
+        signature = _snapshot_signature(stats)
+        snapshot = _load_faces_snapshot(signature)
+        if snapshot is not None:
+            employees, matrices, row_counts, ann_index = snapshot
+        else:
+            employees, matrix, row_counts = _load_registered_employees(registered)
+            matrices = build_face_matrices(matrix)
+            ann_index = build_ann_index(matrix)
+            _save_faces_snapshot(signature, employees, matrices, row_counts, ann_index)
+        
+        row_ends = np.cumsum(row_counts, dtype=np.intp)
+        row_starts = row_ends - np.asarray(row_counts, dtype=np.intp)
+        
+        faces = {
+            'employees': employees,
+            **matrices,
+            'row_starts': row_starts,
+            'row_ends': row_ends,
+            # Empleado (posición en `employees`) dueño de cada fila de la matriz
+            'row_owner': np.repeat(np.arange(len(employees)), row_counts),
+            'ann_index': ann_index,
+        }
+        _ENCODING_CACHE['key'] = key
+        _ENCODING_CACHE['faces'] = faces
+        logger.info(
+            f"Caché de encodings {'cargada desde disco' if snapshot is not None else 'reconstruida'}: "
+            f"{len(employees)} empleados, {len(matrices['matrix'])} encodings"
+        )
+        return faces
+
+
 class AdvancedFaceRecognitionService:
     def __init__(self):
         # CONFIGURACIÓN BALANCEADA PARA USO REAL
@@ -38,6 +431,7 @@ class AdvancedFaceRecognitionService:
             'quality_threshold': 0.25,               # Acepta imágenes de calidad más baja
             'face_area_threshold': 2000,             # Área de rostro más pequeña permitida
             'min_face_size': 40,                     # Tamaño mínimo de rostro reducido
+            'verification_max_side': 640,            # Lado máximo de la foto de verificación (px)
             
             # --- CONFIGURACIONES DE SEGURIDAD FLEXIBLES ---
             'strict_mode': True,                     # Modo estricto general activado
@@ -55,6 +449,9 @@ class AdvancedFaceRecognitionService:
             'brightness_adaptation': True,           # Adaptación de brillo
             'contrast_enhancement': True,            # Mejora de contraste
             'blur_detection': True,                  # Detección de desenfoque
+            'min_laplacian_variance': 60.0,          # Varianza Laplaciana mínima antes de verificar
+            'face_presence_check': True,             # Filtro Haar rápido: descartar fotos sin rostro
+            'presence_min_neighbors': 5,             # minNeighbors del clasificador Haar
             'adaptive_tolerance': True,              # Tolerancia adaptativa
             
             # --- PARÁMETROS FLEXIBLES ADICIONALES ---
@@ -131,6 +528,34 @@ class AdvancedFaceRecognitionService:
                 'is_acceptable': True  # Por defecto aceptable
             }
 
+    def is_too_blurry(self, gray_array):
+        """Filtro rápido de desenfoque (varianza del Laplaciano) previo a la detección"""
+        if not self.ADVANCED_CONFIG['blur_detection'] or gray_array is None:
+            return False
+        laplacian_var = cv2.Laplacian(gray_array, cv2.CV_64F).var()
+        return laplacian_var < self.ADVANCED_CONFIG['min_laplacian_variance']
+
+    def has_face_candidate(self, gray_array):
+        """
+        Filtro rápido de presencia de rostro (Haar) previo al pipeline completo.
+        Si el clasificador no está disponible no se descarta nada.
+        """
+        if not self.ADVANCED_CONFIG['face_presence_check'] or gray_array is None:
+            return True
+        
+        cascade = _get_face_cascade()
+        if cascade is None:
+            return True
+        
+        min_size = self.ADVANCED_CONFIG['min_face_size']
+        faces = cascade.detectMultiScale(
+            gray_array,
+            scaleFactor=1.1,
+            minNeighbors=self.ADVANCED_CONFIG['presence_min_neighbors'],
+            minSize=(min_size, min_size)
+        )
+        return len(faces) > 0
+
     def is_frontal_face(self, face_landmarks):
         """Verificación de frontalidad muy permisiva"""
         try:
@@ -155,16 +580,16 @@ class AdvancedFaceRecognitionService:
             logger.error(f"Error verificando rostro frontal: {e}")
             return True  # En caso de error, asumir válido
 
-    def advanced_face_comparison(self, stored_data, current_encoding, current_landmarks):
-        """Comparación facial balanceada para uso real"""
+    def advanced_face_comparison(self, stored_data, current_encoding, current_landmarks, metrics=None):
+        """
+        Comparación facial balanceada para uso real.
+        `metrics` opcional: (euclidiana, coseno, correlación) ya calculadas para las filas
+        de `encoding_matrix`, como las obtiene advanced_verify para todos a la vez.
+        """
         try:
-            stored_encodings = stored_data.get('encodings', [])
             stored_landmarks = stored_data.get('landmarks', [])
             environmental_adaptations = stored_data.get('environmental_adaptations', [])
             
-            if not stored_encodings:
-                return False, 0.0, "Sin datos de rostro registrados"
-            
             # Contadores balanceados
             excellent_matches = 0       # Distancia < 0.35
             high_quality_matches = 0    # Distancia <= base_tolerance
@@ -177,14 +602,30 @@ class AdvancedFaceRecognitionService:
             max_euclidean = self.ADVANCED_CONFIG['max_euclidean_distance']
             min_cosine = self.ADVANCED_CONFIG['min_cosine_similarity']
             base_tolerance = self.ADVANCED_CONFIG['base_tolerance']
-            
-            for i, stored_enc in enumerate(stored_encodings):
-                if stored_enc is None:
-                    continue
-                
-                stored_enc_array = np.array(stored_enc)
-                distances = face_recognition.face_distance([stored_enc_array], current_encoding)
-                euclidean_dist = distances[0]
+
+            # Matriz (M, 128) float32 con todos los encodings válidos: las
+            # métricas se calculan con un solo producto matriz-vector
+            prepare_stored_face_data(stored_data)
+            valid_indices = stored_data['encoding_indices']
+            if not valid_indices:
+                return False, 0.0, "Sin datos de rostro registrados"
+
+            if metrics is not None:
+                euclidean_distances, cosine_similarities, correlations = metrics
+            else:
+                stored_matrix = stored_data['encoding_matrix']
+                probe = np.asarray(current_encoding, dtype=np.float32)
+
+                euclidean_distances = np.linalg.norm(stored_matrix - probe, axis=1)
+                cosine_similarities = np.dot(normalize_rows(stored_matrix), normalize_rows(probe))
+                # Correlación de Pearson = coseno de los vectores centrados
+                correlations = np.dot(
+                    normalize_rows(stored_matrix - stored_matrix.mean(axis=1, keepdims=True)),
+                    normalize_rows(probe - probe.mean())
+                )
+
+            for row, i in enumerate(valid_indices):
+                euclidean_dist = float(euclidean_distances[row])
                 all_distances.append(euclidean_dist)
                 
                 # Categorización más permisiva
@@ -199,22 +640,16 @@ class AdvancedFaceRecognitionService:
                 euclidean_score = max(0, 1 - (euclidean_dist / max_euclidean))
                 
                 # Similitud coseno más permisiva
-                try:
-                    cosine_sim = 1 - distance.cosine(stored_enc_array, current_encoding)
-                    if np.isnan(cosine_sim):
-                        cosine_sim = 0.5  # Valor neutro si hay NaN
-                    cosine_sim = max(0, cosine_sim)
-                except Exception:
-                    cosine_sim = 0.5  # Valor neutro por defecto
-                
-                # Correlación con manejo de errores
-                try:
-                    correlation = np.corrcoef(stored_enc_array, current_encoding)[0, 1]
-                    if np.isnan(correlation):
-                        correlation = 0.5
-                    correlation = max(0, correlation)
-                except Exception:
+                cosine_sim = float(cosine_similarities[row])
+                if np.isnan(cosine_sim):
+                    cosine_sim = 0.5  # Valor neutro si hay NaN
+                cosine_sim = max(0, cosine_sim)
+
+                # Correlación con manejo de NaN
+                correlation = float(correlations[row])
+                if np.isnan(correlation):
                     correlation = 0.5
+                correlation = max(0, correlation)
                 
                 # Cálculo de puntaje balanceado
                 combined_score = (
@@ -418,7 +853,7 @@ class AdvancedFaceRecognitionService:
                     adapted = ImageEnhance.Contrast(adapted).enhance(condition['contrast'])
                     
                     adapted_array = np.array(adapted)
-                    encoding = face_recognition.face_encodings(
+                    encoding = face_encodings_locked(
                         adapted_array, [face_location], num_jitters=1, model="large"
                     )
                     
@@ -477,6 +912,49 @@ class AdvancedFaceRecognitionService:
             logger.error(f"Error extrayendo landmarks: {e}")
             return None
 
+    def decode_registration_photo(self, photo_base64):
+        """Decodifica una foto de registro a (imagen PIL RGB, array) limitada a 1000px"""
+        # Decodificar, reducir y pasar a RGB con OpenCV (libjpeg-turbo, sin copias de PIL)
+        bgr_array = decode_base64_image(photo_base64)
+        if bgr_array is None:
+            raise ValueError("Imagen inválida o formato no soportado")
+        
+        bgr_array = resize_to_max_side(bgr_array, 1000)
+        image_array = cv2.cvtColor(bgr_array, cv2.COLOR_BGR2RGB)
+        
+        return Image.fromarray(image_array), image_array
+
+    def batch_locate_faces(self, decoded_photos):
+        """
+        Con GPU, detecta los rostros de todas las fotos de registro en un solo lote CNN.
+        Retorna {índice: face_location} para las fotos con un rostro suficientemente grande;
+        las demás (o todas, sin CUDA o con tamaños distintos) usan la detección por foto.
+        """
+        if not CNN_BATCH_AVAILABLE:
+            return {}
+        
+        indexed_arrays = [
+            (idx, decoded[1]) for idx, decoded in enumerate(decoded_photos)
+            if not isinstance(decoded, Exception)
+        ]
+        # batch_face_locations necesita imágenes del mismo tamaño
+        if len(indexed_arrays) < 2 or len({arr.shape for _, arr in indexed_arrays}) != 1:
+            return {}
+        
+        try:
+            batch_locations = batch_cnn_face_locations_locked([arr for _, arr in indexed_arrays])
+        except Exception as e:
+            logger.warning(f"Detección por lotes falló, se usa detección por foto: {e}")
+            return {}
+        
+        located = {}
+        for (idx, _), face_locations in zip(indexed_arrays, batch_locations):
+            for top, right, bottom, left in face_locations:
+                if (right - left) * (bottom - top) >= self.ADVANCED_CONFIG['face_area_threshold']:
+                    located[idx] = (top, right, bottom, left)
+                    break
+        return located
+
     def process_advanced_registration(self, photos_base64):
         """Proceso de registro optimizado para 5 fotos"""
         all_encodings = []
@@ -488,23 +966,24 @@ class AdvancedFaceRecognitionService:
         
         print(f"\nIniciando registro balanceado con {len(photos_base64)} fotos...")
         
-        for idx, photo_base64 in enumerate(photos_base64):
+        # Decodificar todas las fotos primero para poder detectar rostros en lote
+        decoded_photos = []
+        for photo_base64 in photos_base64:
+            try:
+                decoded_photos.append(self.decode_registration_photo(photo_base64))
+            except Exception as e:
+                decoded_photos.append(e)
+        
+        batch_face_locations = self.batch_locate_faces(decoded_photos)
+        
+        for idx, decoded in enumerate(decoded_photos):
             try:
                 print(f"Procesando foto {idx+1}/{len(photos_base64)}...")
                 
-                if ',' in photo_base64:
-                    photo_base64 = photo_base64.split(',')[1]
-                
-                image_data = base64.b64decode(photo_base64)
-                image = Image.open(io.BytesIO(image_data))
-                
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
+                if isinstance(decoded, Exception):
+                    raise decoded
                 
-                if image.width > 1000 or image.height > 1000:
-                    image.thumbnail((1000, 1000), Image.Resampling.LANCZOS)
-                
-                image_array = np.array(image)
+                image, image_array = decoded
                 
                 # Verificación de calidad permisiva
                 quality_info = self.detect_image_quality(image_array)
@@ -519,10 +998,10 @@ class AdvancedFaceRecognitionService:
                     all_environmental_adaptations.append([])
                     continue
                 
-                # Detección de rostro con múltiples intentos
-                enhanced_versions = self.enhance_image_quality(image)
-                face_location = None
-                best_image_array = None
+                # Detección de rostro con múltiples intentos (salvo que el lote ya lo encontrara)
+                face_location = batch_face_locations.get(idx)
+                best_image_array = image_array if face_location else None
+                enhanced_versions = [] if face_location else self.enhance_image_quality(image)
                 
                 for enhanced_img in enhanced_versions:
                     enhanced_array = np.array(enhanced_img)
@@ -553,9 +1032,7 @@ class AdvancedFaceRecognitionService:
                     
                     # Si HOG falla, intentar CNN
                     try:
-                        face_locations = face_recognition.face_locations(
-                            enhanced_array, model="cnn"
-                        )
+                        face_locations = cnn_face_locations_locked(enhanced_array)
                         if face_locations:
                             face_location = face_locations[0]
                             best_image_array = enhanced_array
@@ -575,7 +1052,7 @@ class AdvancedFaceRecognitionService:
                 encodings = None
                 for num_jitters in [8, 5, 3]:  # Reducido para eficiencia
                     try:
-                        encodings = face_recognition.face_encodings(
+                        encodings = face_encodings_locked(
                             best_image_array,
                             [face_location],
                             num_jitters=num_jitters,
@@ -662,30 +1139,20 @@ class AdvancedFaceRecognitionService:
             'quality_scores': quality_scores
         }
 
-    def advanced_verify(self, photo_base64):
-        """Verificación balanceada y eficiente"""
+    def advanced_verify(self, image_array):
+        """Verificación balanceada y eficiente sobre una imagen RGB ya decodificada (uint8 H×W×3)"""
         def verify_process():
             try:
                 start_time = time.time()
                 
-                if ',' in photo_base64:
-                    photo_data = photo_base64.split(',')[1]
-                else:
-                    photo_data = photo_base64
-                
-                image_data = base64.b64decode(photo_data)
-                image = Image.open(io.BytesIO(image_data))
-                
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                if image.width > 1200 or image.height > 1200:
-                    image.thumbnail((1200, 1200), Image.Resampling.LANCZOS)
-                
-                image_array = np.array(image)
+                # Reducir a la resolución útil del detector antes de procesar
+                rgb_array = resize_to_max_side(
+                    image_array, self.ADVANCED_CONFIG['verification_max_side']
+                )
+                image = Image.fromarray(rgb_array)
                 
                 # Verificación de calidad más permisiva
-                quality_info = self.detect_image_quality(image_array)
+                quality_info = self.detect_image_quality(rgb_array)
                 
                 # Solo rechazar si la calidad es extremadamente baja
                 if quality_info['overall_quality'] < self.ADVANCED_CONFIG['min_quality_for_verification']:
@@ -731,9 +1198,7 @@ class AdvancedFaceRecognitionService:
                     
                     # Si HOG falla, intentar CNN como respaldo
                     try:
-                        face_locations = face_recognition.face_locations(
-                            enhanced_array, model="cnn"
-                        )
+                        face_locations = cnn_face_locations_locked(enhanced_array)
                         if face_locations:
                             face_location = face_locations[0]
                             best_image_array = enhanced_array
@@ -748,7 +1213,7 @@ class AdvancedFaceRecognitionService:
                     }
                 
                 # Extracción de características con timeouts
-                current_encoding = face_recognition.face_encodings(
+                current_encoding = face_encodings_locked(
                     best_image_array,
                     [face_location],
                     num_jitters=3,  # Reducido para velocidad
@@ -779,31 +1244,68 @@ class AdvancedFaceRecognitionService:
                 best_confidence = 0
                 all_results = []
                 
-                employees_with_faces = Employee.objects.filter(
-                    is_active=True,
-                    has_face_registered=True
-                ).select_related()
+                faces = get_registered_faces()
+                employees = faces['employees']
+                
+                probe = np.asarray(current_encoding, dtype=np.float32)
+                unit_probe = normalize_rows(probe)
+                centered_probe = normalize_rows(probe - probe.mean())
                 
-                for employee in employees_with_faces:
+                if faces['ann_index'] is not None:
+                    # Muchos encodings: solo se evalúan los dueños de los vecinos más cercanos
+                    labels, _ = faces['ann_index'].knn_query(
+                        probe, k=min(ANN_NEIGHBORS, len(faces['matrix']))
+                    )
+                    positions = sorted(set(faces['row_owner'][labels[0]].tolist()))
+                    all_euclidean = None
+                else:
+                    # Métricas contra todos los encodings registrados en una sola pasada
+                    positions = range(len(employees))
+                    all_euclidean = np.linalg.norm(faces['matrix'] - probe, axis=1)
+                    all_cosine = faces['unit_matrix'] @ unit_probe
+                    all_correlation = faces['centered_matrix'] @ centered_probe
+                
+                max_tolerance = self.ADVANCED_CONFIG['max_tolerance']
+                
+                for position in positions:
                     if time.time() - start_time > self.ADVANCED_CONFIG['verification_timeout'] * 0.9:
                         break
                     
+                    employee = employees[position]
+                    rows = slice(faces['row_starts'][position], faces['row_ends'][position])
+                    if all_euclidean is not None:
+                        metrics = (all_euclidean[rows], all_cosine[rows], all_correlation[rows])
+                    else:
+                        metrics = (
+                            np.linalg.norm(faces['matrix'][rows] - probe, axis=1),
+                            faces['unit_matrix'][rows] @ unit_probe,
+                            faces['centered_matrix'][rows] @ centered_probe
+                        )
+                    
+                    # Sin ningún encoding dentro de max_tolerance la comparación completa no
+                    # puede aceptar al empleado: solo se puntúan los candidatos restantes
+                    closest_dist = float(metrics[0].min())
+                    if closest_dist > max_tolerance:
+                        all_results.append({
+                            'employee_id': employee['id'],
+                            'employee_name': employee['name'],
+                            'confidence': 0.0,
+                            'match': False,
+                            'details': f"Sin matches aceptables (distancia mínima {closest_dist:.2f})"
+                        })
+                        continue
+                    
                     try:
-                        stored_encodings_json = employee.face_encoding
-                        if not stored_encodings_json:
-                            continue
-                        
-                        stored_data = json.loads(stored_encodings_json)
-                        
                         is_match, confidence, details = self.advanced_face_comparison(
-                            stored_data,
+                            get_employee_face_data(employee),
                             current_encoding,
-                            current_landmarks_vector
+                            current_landmarks_vector,
+                            metrics=metrics
                         )
                         
                         all_results.append({
-                            'employee_id': employee.id,
-                            'employee_name': employee.name,
+                            'employee_id': employee['id'],
+                            'employee_name': employee['name'],
                             'confidence': confidence,
                             'match': is_match,
                             'details': details
@@ -812,15 +1314,15 @@ class AdvancedFaceRecognitionService:
                         if is_match and confidence > best_confidence:
                             best_confidence = confidence
                             best_match_data = {
-                                'id': employee.id,
-                                'name': employee.name,
-                                'employee_id': employee.employee_id,
-                                'rut': employee.rut,
-                                'department': employee.department,
+                                'id': employee['id'],
+                                'name': employee['name'],
+                                'employee_id': employee['employee_id'],
+                                'rut': employee['rut'],
+                                'department': employee['department'],
                             }
                             
                     except Exception as e:
-                        logger.error(f"Error comparando con {employee.name}: {e}")
+                        logger.error(f"Error comparando con {employee['name']}: {e}")
                         continue
                 
                 # Resultado final
@@ -0,0 +1,30 @@
+# Índice GIN de trigramas sobre Employee.name (solo PostgreSQL)
+
+from django.db import migrations
+
+
+def create_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS emp_name_trgm "
+        "ON facial_recognition_employee USING gin (name gin_trgm_ops);"
+    )
+
+
+def drop_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS emp_name_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facial_recognition', '0005_add_rut_and_advanced_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_trigram_index, drop_name_trigram_index),
+    ]
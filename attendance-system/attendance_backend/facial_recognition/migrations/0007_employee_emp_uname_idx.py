@@ -0,0 +1,16 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facial_recognition', '0006_employee_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='emp_uname_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_records(apps, schema_editor):
+    """Deja un solo registro por (empleado, timestamp, tipo) antes de crear la restricción única"""
+    AttendanceRecord = apps.get_model('facial_recognition', 'AttendanceRecord')
+    duplicates = (
+        AttendanceRecord.objects.values('employee_id', 'timestamp', 'attendance_type')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for key in duplicates:
+        ids = list(
+            AttendanceRecord.objects.filter(
+                employee_id=key['employee_id'],
+                timestamp=key['timestamp'],
+                attendance_type=key['attendance_type']
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        AttendanceRecord.objects.filter(pk__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facial_recognition', '0008_attendancerecord_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(remove_duplicate_records, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendancerecord',
+            constraint=models.UniqueConstraint(fields=('employee', 'timestamp', 'attendance_type'), name='att_unique_employee_timestamp_type'),
+        ),
+    ]
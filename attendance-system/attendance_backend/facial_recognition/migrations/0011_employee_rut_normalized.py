@@ -0,0 +1,27 @@
+import re
+
+from django.db import migrations, models
+
+
+def backfill_rut_normalized(apps, schema_editor):
+    Employee = apps.get_model('facial_recognition', 'Employee')
+    employees = list(Employee.objects.only('id', 'rut'))
+    for employee in employees:
+        employee.rut_normalized = re.sub(r'[^0-9kK]', '', employee.rut or '').upper()
+    Employee.objects.bulk_update(employees, ['rut_normalized'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facial_recognition', '0010_employee_active_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='rut_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_rut_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facial_recognition', '0011_employee_rut_normalized'),
+    ]
+
+    operations = [
+        # (timestamp, verification_method) ya sirve los rangos por timestamp
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='att_timestamp_idx',
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['timestamp', 'verification_method'], name='att_timestamp_method_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def create_employee_list_version(apps, schema_editor):
+    DataVersion = apps.get_model('facial_recognition', 'DataVersion')
+    DataVersion.objects.get_or_create(name='employee_list')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facial_recognition', '0012_attendancerecord_timestamp_method_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versión de Datos',
+                'verbose_name_plural': 'Versiones de Datos',
+            },
+        ),
+        migrations.RunPython(create_employee_list_version, migrations.RunPython.noop),
+    ]
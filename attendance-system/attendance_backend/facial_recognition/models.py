@@ -1,11 +1,53 @@
 from django.db import models
+from django.utils import timezone
+from django.db.models.functions import Upper
 import uuid
+import re
+import operator
+
+
+RUT_CLEAN_RE = re.compile(r'[^0-9kK]')
+
+
+# Pesos del módulo 11 desde el dígito menos significativo (2..7 cíclico) y el
+# dígito verificador esperado según el resto: 0 -> '0', 1 -> 'K', r -> 11 - r
+RUT_WEIGHTS = (2, 3, 4, 5, 6, 7, 2, 3)
+RUT_CHECK_DIGITS = '0K987654321'
+
+
+def normalize_rut(rut):
+    """RUT solo con dígitos y K mayúscula (12.345.678-k -> 12345678K)"""
+    return RUT_CLEAN_RE.sub('', str(rut or '').strip()).upper()
+
+
+def validate_chilean_rut(rut):
+    """Valida RUT chileno con formato flexible"""
+    if not rut:
+        return False
+    
+    clean_rut = normalize_rut(rut)
+    
+    if len(clean_rut) < 8 or len(clean_rut) > 9:
+        return False
+    
+    rut_body = clean_rut[:-1]
+    dv = clean_rut[-1]
+    
+    if not rut_body.isdigit():
+        return False
+    
+    sum_total = sum(map(operator.mul, map(int, reversed(rut_body)), RUT_WEIGHTS))
+    
+    return dv == RUT_CHECK_DIGITS[sum_total % 11]
+
 
 class Employee(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     employee_id = models.CharField(max_length=20, unique=True)
     name = models.CharField(max_length=100)
     rut = models.CharField(max_length=12, unique=True, help_text="RUT con formato 12345678-9")
+    # RUT sin puntos ni guión: búsquedas por QR con cualquier formato usan este índice
+    rut_normalized = models.CharField(max_length=12, db_index=True, blank=True, default='', editable=False)
     email = models.EmailField()
     department = models.CharField(max_length=50)
     position = models.CharField(max_length=50)
@@ -37,42 +79,25 @@ class Employee(models.Model):
     
     def validate_rut(self):
         """Valida el RUT chileno"""
-        if not self.rut:
-            return False
-        
-        clean_rut = self.clean_rut().replace('-', '').replace('.', '').upper()
-        if len(clean_rut) < 2:
-            return False
-            
-        rut_body = clean_rut[:-1]
-        dv = clean_rut[-1]
-        
-        # Calcular dígito verificador
-        multiplier = 2
-        sum_total = 0
-        
-        for digit in reversed(rut_body):
-            if not digit.isdigit():
-                return False
-            sum_total += int(digit) * multiplier
-            multiplier = 7 if multiplier == 2 else multiplier + 1
-            if multiplier > 7:
-                multiplier = 2
-        
-        remainder = sum_total % 11
-        expected_dv = 'K' if remainder == 10 else str((11 - remainder) % 11)
-        
-        return dv == expected_dv
+        return validate_chilean_rut(self.rut)
     
     def save(self, *args, **kwargs):
         if self.rut:
             self.rut = self.clean_rut()
+        self.rut_normalized = normalize_rut(self.rut)
         super().save(*args, **kwargs)
     
     class Meta:
         verbose_name = "Empleado"
         verbose_name_plural = "Empleados"
         ordering = ['name']
+        indexes = [
+            # Búsquedas exactas por nombre sin distinguir mayúsculas (mark_attendance, sincronización)
+            models.Index(Upper('name'), name='emp_uname_idx'),
+            # Filtros de sincronización y listado: is_active + employee_id / is_active ordenado por nombre
+            models.Index(fields=['is_active', 'employee_id'], name='emp_active_id_idx'),
+            models.Index(fields=['is_active', 'name'], name='emp_active_name_idx'),
+        ]
 
 class AttendanceRecord(models.Model):
     ATTENDANCE_TYPES = [
@@ -89,7 +114,7 @@ class AttendanceRecord(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records')
     attendance_type = models.CharField(max_length=10, choices=ATTENDANCE_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # Editable para respetar la hora de registros offline
     
     # Ubicación
     location_lat = models.FloatField(null=True, blank=True)
@@ -110,6 +135,18 @@ class AttendanceRecord(models.Model):
         ordering = ['-timestamp']
         verbose_name = "Registro de Asistencia"
         verbose_name_plural = "Registros de Asistencia"
+        indexes = [
+            models.Index(fields=['employee', '-timestamp'], name='att_employee_timestamp_idx'),
+            # Cubre los rangos por timestamp (en ambos sentidos) y el conteo por método de verificación
+            models.Index(fields=['timestamp', 'verification_method'], name='att_timestamp_method_idx'),
+        ]
+        constraints = [
+            # Evita duplicados al reenviar la misma sincronización offline
+            models.UniqueConstraint(
+                fields=['employee', 'timestamp', 'attendance_type'],
+                name='att_unique_employee_timestamp_type'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.employee.name} - {self.attendance_type} - {self.timestamp}"
@@ -124,4 +161,16 @@ class AttendanceRecord(models.Model):
         elif self.verification_method == 'manual':
             return "Manual/GPS"
         else:
-            return "Verificación pendiente"
\ No newline at end of file
+            return "Verificación pendiente"
+
+class DataVersion(models.Model):
+    """Contador persistido que versiona datos cacheados (p. ej. el ETag de la lista de empleados)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versión de Datos"
+        verbose_name_plural = "Versiones de Datos"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,32 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se usa el json estándar de DRF
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer que serializa la respuesta con orjson cuando está instalado.
+    Se aplica solo a las listas grandes (get_employees, get_attendance_records). Mantiene el
+    formato de DRF: fechas con zona en 'Z', claves no str convertidas a texto; a diferencia
+    de DRF, un NaN se escribe como null en vez de producir un error.
+    """
+
+    # Tipos que orjson no conoce (Decimal, textos lazy, querysets) se resuelven como en DRF
+    _fallback_encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        return orjson.dumps(
+            data,
+            default=self._fallback_encoder.default,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
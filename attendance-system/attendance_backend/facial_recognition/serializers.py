@@ -17,6 +17,9 @@ class EmployeeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'face_registration_date']
     
     def get_attendance_count(self, obj):
+        # Usa el conteo anotado en la consulta cuando está disponible
+        if hasattr(obj, 'attendance_total'):
+            return obj.attendance_total
         return obj.attendance_records.count()
     
     def get_face_quality_display(self, obj):
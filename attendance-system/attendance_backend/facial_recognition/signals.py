@@ -0,0 +1,33 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AttendanceRecord, DataVersion, Employee
+
+# Fila de DataVersion que forma el ETag de get_employees (la lista incluye el conteo de asistencias).
+# Vive en la BD para que todos los procesos vean el mismo valor.
+EMPLOYEE_LIST_VERSION = 'employee_list'
+
+
+def get_employee_list_version():
+    """Versión actual de la lista de empleados (una lectura por clave primaria)"""
+    version = DataVersion.objects.filter(name=EMPLOYEE_LIST_VERSION).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_employee_list_version():
+    """
+    Invalida el ETag y la respuesta en caché de get_employees.
+    El UPDATE corre en la transacción del cambio: la versión nueva se ve junto con los datos.
+    """
+    updated = DataVersion.objects.filter(name=EMPLOYEE_LIST_VERSION).update(version=F('version') + 1)
+    if not updated:
+        DataVersion.objects.get_or_create(name=EMPLOYEE_LIST_VERSION, defaults={'version': 1})
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+def employee_list_changed(sender, **kwargs):
+    bump_employee_list_version()
@@ -1,3 +1,243 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .face_recognition_utils import (
+    dumps_face_data, loads_face_data, pack_encodings, prepare_stored_face_data, unpack_encodings
+)
+from .models import AttendanceRecord, Employee, normalize_rut, validate_chilean_rut
+from .views import MAX_ATTENDANCE_PAGE_SIZE, search_employee_by_rut
+
+
+def create_employee(employee_id='EMP001', name='Ana Pérez', rut='12.345.678-5'):
+    return Employee.objects.create(
+        employee_id=employee_id, name=name, rut=rut,
+        email=f'{employee_id.lower()}@empresa.cl', department='Operaciones', position='Operario'
+    )
+
+
+class RutTests(APITestCase):
+    def test_validate_chilean_rut(self):
+        self.assertTrue(validate_chilean_rut('12.345.678-5'))
+        self.assertTrue(validate_chilean_rut('123456785'))
+        self.assertTrue(validate_chilean_rut('11.111.111-1'))
+        self.assertFalse(validate_chilean_rut('12.345.678-4'))
+        self.assertFalse(validate_chilean_rut('1234-5'))
+        self.assertFalse(validate_chilean_rut(''))
+
+    def test_check_digit_k(self):
+        self.assertTrue(validate_chilean_rut('10.000.013-k'))
+        self.assertTrue(validate_chilean_rut('10000013K'))
+
+    def test_rut_normalized_is_stored_on_save(self):
+        employee = create_employee(rut='12.345.678-5')
+        self.assertEqual(employee.rut_normalized, normalize_rut('12.345.678-5'))
+        self.assertEqual(employee.rut_normalized, '123456785')
+
+    def test_search_employee_by_rut_ignores_format(self):
+        employee = create_employee(rut='12.345.678-5')
+        for rut in ('12345678-5', '12.345.678-5', '123456785'):
+            self.assertEqual(search_employee_by_rut(rut).id, employee.id)
+        self.assertIsNone(search_employee_by_rut('11.111.111-1'))
+
+    def test_verify_qr_with_plain_rut(self):
+        employee = create_employee(rut='12.345.678-5')
+        response = self.client.post(
+            reverse('verify_qr'), {'qr_data': '12.345.678-5', 'type': 'entrada'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['employee']['id'], str(employee.id))
+        self.assertEqual(AttendanceRecord.objects.filter(employee=employee, verification_method='qr').count(), 1)
+
+    def test_verify_qr_unknown_rut(self):
+        response = self.client.post(
+            reverse('verify_qr'), {'qr_data': '11.111.111-1', 'type': 'entrada'}, format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class OfflineSyncTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.employee = create_employee()
+
+    def sync(self, records):
+        return self.client.post(reverse('sync_offline_records'), {'offline_records': records}, format='json')
+
+    def manual_record(self, local_id, hour, attendance_type='entrada', **extra):
+        return dict({
+            'local_id': local_id,
+            'employee_id': self.employee.employee_id,
+            'type': attendance_type,
+            'timestamp': f'2024-03-01T{hour:02d}:00:00Z',
+        }, **extra)
+
+    def test_replayed_batch_is_reported_as_duplicates(self):
+        records = [self.manual_record('a', 8), self.manual_record('b', 18, 'salida')]
+        first = self.sync(records)
+        self.assertEqual(first.data['synced_count'], 2)
+        self.assertEqual(first.data['duplicate_count'], 0)
+
+        second = self.sync(records)
+        self.assertEqual(second.data['synced_count'], 0)
+        self.assertEqual(second.data['duplicate_count'], 2)
+        self.assertEqual(AttendanceRecord.objects.count(), 2)
+
+    def test_invalid_attendance_type_is_reported(self):
+        response = self.sync([
+            self.manual_record('a', 8),
+            self.manual_record('b', 9, None),
+            self.manual_record('c', 10, 'almuerzo'),
+        ])
+        self.assertEqual(response.data['synced_count'], 1)
+        self.assertEqual(response.data['error_count'], 2)
+        self.assertEqual({error['local_id'] for error in response.data['errors']}, {'b', 'c'})
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+
+    def test_failed_batch_falls_back_to_single_records(self):
+        response = self.sync([
+            self.manual_record('a', 8),
+            self.manual_record('b', 9, latitude='no-es-un-numero'),
+            self.manual_record('c', 10),
+        ])
+        self.assertEqual(response.data['synced_count'], 2)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertEqual(response.data['errors'][0]['local_id'], 'b')
+        self.assertEqual(AttendanceRecord.objects.count(), 2)
+
+    def test_unknown_employee_is_reported(self):
+        response = self.sync([dict(self.manual_record('a', 8), employee_id='NO-EXISTE')])
+        self.assertEqual(response.data['synced_count'], 0)
+        self.assertEqual(response.data['error_count'], 1)
+
+    def test_mark_attendance_replay_is_idempotent(self):
+        payload = {
+            'employee_id': self.employee.employee_id,
+            'type': 'entrada',
+            'is_offline_sync': True,
+            'offline_timestamp': '2024-03-01T08:00:00Z',
+        }
+        first = self.client.post(reverse('mark_attendance'), payload, format='json')
+        second = self.client.post(reverse('mark_attendance'), payload, format='json')
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first.data['duplicate'])
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.data['duplicate'])
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+
+
+class AttendanceRecordsPaginationTests(APITestCase):
+    def setUp(self):
+        employee = create_employee()
+        now = timezone.now()
+        for minutes in range(5):
+            AttendanceRecord.objects.create(
+                employee=employee, attendance_type='entrada',
+                timestamp=now - timedelta(minutes=minutes), verification_method='manual'
+            )
+
+    def get_records(self, **params):
+        return self.client.get(reverse('get_attendance_records'), params)
+
+    def test_cursor_walks_all_records_without_overlap(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.get_records(**params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(record['id'] for record in response.json()['records'])
+            cursor = response.json()['next_cursor']
+            if not response.json()['has_more']:
+                self.assertIsNone(cursor)
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_with_total_counts_whole_range(self):
+        body = self.get_records(limit=2, with_total=1).json()
+        self.assertEqual(body['total'], 5)
+        self.assertEqual(body['statistics']['manual_entries'], 5)
+
+    def test_limit_zero_is_clamped_to_one(self):
+        response = self.get_records(limit=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertIsNotNone(response.json()['next_cursor'])
+
+    def test_oversized_limit_is_capped_not_rejected(self):
+        response = self.get_records(limit=MAX_ATTENDANCE_PAGE_SIZE * 10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 5)
+
+    def test_non_integer_limit_is_rejected(self):
+        self.assertEqual(self.get_records(limit='abc').status_code, 400)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.get_records(cursor='no-es-un-cursor').status_code, 400)
+
+
+class EmployeesETagTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.employee = create_employee()
+
+    def get_employees(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('get_employees'), **headers)
+
+    def test_unchanged_list_returns_304(self):
+        first = self.get_employees()
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        self.assertEqual(self.get_employees(first['ETag']).status_code, 304)
+
+    def test_backdated_insert_after_delete_changes_etag(self):
+        old_record = AttendanceRecord.objects.create(employee=self.employee, attendance_type='entrada')
+        first = self.get_employees()
+
+        # Mismo total y MAX(timestamp) que antes: solo la versión persistida detecta el cambio
+        AttendanceRecord.objects.filter(id=old_record.id).delete()
+        AttendanceRecord.objects.create(
+            employee=self.employee, attendance_type='salida',
+            timestamp=timezone.now() - timedelta(days=1)
+        )
+
+        second = self.get_employees(first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.json()['employees'][0]['attendance_count'], 1)
+
+    def test_offline_sync_changes_etag(self):
+        first = self.get_employees()
+        self.client.post(reverse('sync_offline_records'), {'offline_records': [{
+            'local_id': 'a', 'employee_id': self.employee.employee_id,
+            'type': 'entrada', 'timestamp': '2024-03-01T08:00:00Z',
+        }]}, format='json')
+        self.assertEqual(self.get_employees(first['ETag']).status_code, 200)
+
+
+class StoredFaceDataTests(SimpleTestCase):
+    def test_encodings_b64_round_trip(self):
+        encodings = np.random.default_rng(0).random((3, 128), dtype=np.float32)
+        stored = loads_face_data(dumps_face_data({'encodings_b64': pack_encodings(encodings)}))
+
+        prepared = prepare_stored_face_data(stored)
+        np.testing.assert_array_equal(prepared['encoding_matrix'], encodings)
+        self.assertEqual(prepared['encoding_indices'], [0, 1, 2])
+        np.testing.assert_array_equal(unpack_encodings(pack_encodings(encodings)), encodings)
+
+    def test_legacy_list_format_skips_missing_encodings(self):
+        encodings = np.random.default_rng(1).random((2, 128), dtype=np.float32)
+        stored = {'encodings': [encodings[0].tolist(), None, encodings[1].tolist()]}
+
+        prepared = prepare_stored_face_data(stored)
+        self.assertEqual(prepared['encoding_indices'], [0, 2])
+        np.testing.assert_array_equal(prepared['encoding_matrix'], encodings)
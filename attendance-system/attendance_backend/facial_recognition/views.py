@@ -1,9 +1,18 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
-from django.shortcuts import render
+from django.utils.dateparse import parse_datetime
+from django.db import IntegrityError, transaction, connection, connections
+from django.db.models import Count, F, Max, Q, Value
+from django.db.models.functions import Upper
+from django.core.cache import cache
+from django.views.decorators.cache import cache_page
+from django.views.decorators.gzip import gzip_page
+from django.utils.cache import get_conditional_response, quote_etag
+from django.template.loader import render_to_string
+from django.http import HttpResponse, StreamingHttpResponse
 from datetime import datetime, timedelta
 import uuid
 import json
@@ -16,15 +25,25 @@ import numpy as np
 import cv2
 from scipy.spatial import distance
 import time
+from functools import partial
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from django.http import HttpRequest
 import re
+import atexit
+import logging
 
-from .models import Employee, AttendanceRecord
+from .models import Employee, AttendanceRecord, normalize_rut, validate_chilean_rut
+from .renderers import ORJSONRenderer
 from .serializers import EmployeeSerializer, AttendanceRecordSerializer
-from .face_recognition_utils import AdvancedFaceRecognitionService
+from .signals import bump_employee_list_version, get_employee_list_version
+from .face_recognition_utils import (
+    AdvancedFaceRecognitionService, decode_base64_image, dumps_face_data,
+    invalidate_encoding_cache, pack_encodings, resize_to_max_side
+)
+
+logger = logging.getLogger(__name__)
 
 face_recognition_service = AdvancedFaceRecognitionService()
 ADVANCED_CONFIG = face_recognition_service.ADVANCED_CONFIG
@@ -32,10 +51,64 @@ ADVANCED_CONFIG = face_recognition_service.ADVANCED_CONFIG
 FACE_IMAGES_DIR = 'media/employee_faces/'
 os.makedirs(FACE_IMAGES_DIR, exist_ok=True)
 
-def _create_manual_attendance_record(employee, attendance_type, location_lat, location_lng, address, notes, is_offline_sync, offline_timestamp):
+# Hilos que escriben las fotos de muestra del registro facial fuera del request
+_IMAGE_SAVE_POOL = ThreadPoolExecutor(max_workers=2)
+atexit.register(_IMAGE_SAVE_POOL.shutdown)
+
+# Borrado de fotos de un empleado: en paralelo solo si hay más de PHOTO_UNLINK_PARALLEL_MIN
+PHOTO_UNLINK_WORKERS = 8
+PHOTO_UNLINK_PARALLEL_MIN = 4
+
+# Hilos para verificar en paralelo los registros offline con foto/QR
+SYNC_VERIFY_WORKERS = getattr(settings, 'SYNC_VERIFY_WORKERS', 4)
+
+# Tipos de asistencia aceptados en la sincronización offline
+VALID_ATTENDANCE_TYPES = frozenset(choice for choice, _ in AttendanceRecord.ATTENDANCE_TYPES)
+
+# Filas por INSERT al guardar en lote los registros manuales sincronizados
+OFFLINE_BULK_BATCH_SIZE = 200
+
+# Errores detallados que se devuelven en una sincronización (el total se cuenta aparte)
+MAX_SYNC_ERRORS_KEPT = 10
+
+# Segundos que se reutiliza la respuesta de health_check (endpoint de monitoreo)
+HEALTH_CHECK_CACHE_SECONDS = 30
+
+# Vigencia (segundos) del panel web en la caché de vistas
+PANEL_CACHE_SECONDS = 60 * 60
+
+# Vigencia (segundos) de la respuesta de get_employees guardada bajo su ETag
+EMPLOYEE_LIST_CACHE_TTL = 60
+
+# Vigencia (segundos) del índice de empleados activos en la caché
+EMPLOYEE_INDEX_TTL = 300
+
+# Columnas de Employee que necesitan las respuestas de marcaje (y AttendanceRecordSerializer)
+EMPLOYEE_SUMMARY_FIELDS = ('id', 'name', 'employee_id', 'rut', 'department', 'is_active')
+
+# Máximo de registros por página en get_attendance_records
+MAX_ATTENDANCE_PAGE_SIZE = 1000
+
+# Columnas que lee EmployeeSerializer: la lista del panel no necesita face_encoding ni rut_normalized
+EMPLOYEE_LIST_FIELDS = (
+    'id', 'employee_id', 'name', 'rut', 'email', 'department', 'position', 'is_active',
+    'has_face_registered', 'face_quality_score', 'face_registration_date',
+    'face_variations_count', 'created_at', 'updated_at',
+)
+
+# Columnas que lee AttendanceRecordSerializer: evita traer el JSON de encodings del empleado
+ATTENDANCE_RECORD_LIST_FIELDS = (
+    'id', 'attendance_type', 'timestamp', 'location_lat', 'location_lng', 'address',
+    'verification_method', 'face_confidence', 'qr_verified',
+    'notes', 'is_offline_sync', 'device_info',
+    'employee__id', 'employee__name', 'employee__employee_id',
+    'employee__rut', 'employee__department',
+)
+
+def _build_manual_attendance_record(employee, attendance_type, location_lat, location_lng, address, notes, is_offline_sync, offline_timestamp):
     """
-    Función auxiliar para crear un registro de asistencia manual.
-    Centraliza la lógica para ser usada por múltiples vistas.
+    Construye (sin guardar) un registro de asistencia manual.
+    Permite insertar lotes con bulk_create en la sincronización offline.
     """
     if is_offline_sync and offline_timestamp:
         try:
@@ -48,7 +121,7 @@ def _create_manual_attendance_record(employee, attendance_type, location_lat, lo
     else:
         record_timestamp = timezone.now()
     
-    attendance_record = AttendanceRecord.objects.create(
+    return AttendanceRecord(
         employee=employee,
         attendance_type=attendance_type,
         timestamp=record_timestamp,
@@ -59,47 +132,110 @@ def _create_manual_attendance_record(employee, attendance_type, location_lat, lo
         notes=notes or 'Registro manual/GPS',
         is_offline_sync=is_offline_sync
     )
-    return attendance_record
 
-def validate_chilean_rut(rut):
-    """Valida RUT chileno con formato flexible"""
-    if not rut:
-        return False
-    
-    clean_rut = re.sub(r'[^0-9kK]', '', str(rut).strip()).upper()
-    
-    if len(clean_rut) < 8 or len(clean_rut) > 9:
-        return False
-    
-    rut_body = clean_rut[:-1]
-    dv = clean_rut[-1]
+def _create_manual_attendance_record(employee, attendance_type, location_lat, location_lng, address, notes, is_offline_sync, offline_timestamp):
+    """
+    Función auxiliar para crear un registro de asistencia manual.
+    Centraliza la lógica para ser usada por múltiples vistas.
+    Retorna (registro, creado): el reenvío de un registro ya guardado (misma clave
+    empleado/hora/tipo) devuelve el existente en vez de fallar con IntegrityError.
+    """
+    attendance_record = _build_manual_attendance_record(
+        employee, attendance_type, location_lat, location_lng,
+        address, notes, is_offline_sync, offline_timestamp
+    )
+    try:
+        # SAVEPOINT: un conflicto no invalida una transacción exterior
+        with transaction.atomic():
+            attendance_record.save(force_insert=True)
+        return attendance_record, True
+    except IntegrityError:
+        existing = AttendanceRecord.objects.filter(
+            employee=employee,
+            timestamp=attendance_record.timestamp,
+            attendance_type=attendance_record.attendance_type
+        ).select_related('employee').first()
+        if existing is None:
+            raise
+        return existing, False
+
+def save_face_sample(photo_base64, path):
+    """
+    Guarda una foto de muestra en JPEG. Si ya viene como JPEG RGB/escala de grises se
+    escriben los bytes recibidos tal cual; solo se recodifica con PIL cuando hay que
+    convertir formato o espacio de color.
+    """
+    if ',' in photo_base64:
+        photo_base64 = photo_base64.split(',', 1)[1]
     
-    if not rut_body.isdigit():
-        return False
+    image_data = base64.b64decode(photo_base64)
+    # Image.open solo lee la cabecera: el decodificado completo ocurre en convert()
+    image = Image.open(io.BytesIO(image_data))
     
-    multiplier = 2
-    sum_total = 0
+    if image.format == 'JPEG' and image.mode in ('RGB', 'L'):
+        with open(path, 'wb') as sample_file:
+            sample_file.write(image_data)
+        return
     
-    for digit in reversed(rut_body):
-        sum_total += int(digit) * multiplier
-        multiplier = multiplier + 1 if multiplier < 7 else 2
+    # En JPEG (p. ej. CMYK) deja que libjpeg entregue RGB directamente
+    image.draft('RGB', image.size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(path, 'JPEG', quality=90)
+
+def _persist_sample_photos(employee_id, photos):
+    """Escribe en disco las fotos de muestra de un registro facial (corre en _IMAGE_SAVE_POOL)"""
+    for idx, photo in enumerate(photos):
+        try:
+            path = os.path.join(FACE_IMAGES_DIR, f"{employee_id}_variation_{idx+1}.jpg")
+            save_face_sample(photo, path)
+        except Exception as e:
+            logger.warning("No se pudo guardar la foto de muestra %d de %s: %s", idx + 1, employee_id, e)
+
+def _safe_unlink(path):
+    """Borra un archivo ignorando que ya no exista"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def _purge_employee_photos(employee_id):
+    """Elimina las fotos de muestra de un empleado con una sola pasada por FACE_IMAGES_DIR"""
+    prefix = f"{employee_id}_variation_"
+    with os.scandir(FACE_IMAGES_DIR) as entries:
+        paths = [
+            entry.path for entry in entries
+            if entry.name.startswith(prefix) and entry.name.endswith('.jpg')
+        ]
     
-    remainder = sum_total % 11
-    if remainder == 0:
-        expected_dv = '0'
-    elif remainder == 1:
-        expected_dv = 'K'
+    if len(paths) > PHOTO_UNLINK_PARALLEL_MIN:
+        # Con muchas fotos los unlink se solapan en hilos (latencia de disco/red)
+        with ThreadPoolExecutor(max_workers=PHOTO_UNLINK_WORKERS) as executor:
+            list(executor.map(_safe_unlink, paths))
     else:
-        expected_dv = str(11 - remainder)
-    
-    return dv == expected_dv
+        for path in paths:
+            _safe_unlink(path)
+
+def active_employee_summaries():
+    """Empleados activos con solo las columnas que usan las respuestas de asistencia"""
+    return Employee.objects.filter(is_active=True).only(*EMPLOYEE_SUMMARY_FIELDS)
+
+def active_employees_lite():
+    """Empleados activos con solo las columnas de EmployeeSerializer (sin el JSON de encodings faciales)"""
+    return Employee.objects.filter(is_active=True).only(*EMPLOYEE_LIST_FIELDS)
+
+# Patrones compilados una sola vez para extraer RUTs de códigos QR (la limpieza y la
+# validación viven en models.py, igual que rut_normalized)
+RUT_QR_CLEAN_RE = re.compile(r'[^0-9kK-]')
+RUT_IN_TEXT_RE = re.compile(r'(\d{7,8}[-]?[0-9kK])', re.IGNORECASE)
+RUT_DIGITS_RE = re.compile(r'(\d{7,8}[0-9kK])', re.IGNORECASE)
 
 def format_rut_for_storage(rut):
     """Formatea RUT para almacenamiento consistente"""
     if not rut:
         return rut
     
-    clean_rut = re.sub(r'[^0-9kK]', '', str(rut).strip()).upper()
+    clean_rut = normalize_rut(rut)
     
     if len(clean_rut) < 2:
         return clean_rut
@@ -114,38 +250,83 @@ def search_employee_by_rut(rut):
     if not rut:
         return None
     
-    clean_rut = re.sub(r'[^0-9kK]', '', str(rut).strip()).upper()
+    clean_rut = normalize_rut(rut)
     
     if len(clean_rut) < 2:
         return None
     
-    rut_body = clean_rut[:-1]
-    dv = clean_rut[-1]
-    formatted_rut = f"{rut_body}-{dv}"
+    # rut_normalized cubre todos los formatos guardados (con o sin puntos y guión):
+    # una sola consulta sobre su índice
+    return active_employee_summaries().filter(rut_normalized=clean_rut).first()
+
+def search_employee_by_name(name):
+    """Busca empleado activo por nombre usando índice (trigramas en PostgreSQL, UPPER(name) en otros motores)"""
+    if not name:
+        return None
     
-    try:
-        return Employee.objects.get(rut=formatted_rut, is_active=True)
-    except Employee.DoesNotExist:
-        try:
-            return Employee.objects.get(rut=clean_rut, is_active=True)
-        except Employee.DoesNotExist:
-            employees = Employee.objects.filter(is_active=True)
-            for emp in employees:
-                if emp.rut:
-                    emp_clean = re.sub(r'[^0-9kK]', '', emp.rut).upper()
-                    if emp_clean == clean_rut:
-                        return emp
-            return None
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.lookups import TrigramSimilar
+        from django.contrib.postgres.search import TrigramSimilarity
+        
+        # El operador % usa el índice GIN emp_name_trgm; se elige la mejor coincidencia
+        return active_employee_summaries().filter(
+            TrigramSimilar(F('name'), name)
+        ).annotate(
+            similarity=TrigramSimilarity('name', name)
+        ).order_by('-similarity').first()
+    
+    # Coincidencia exacta sin distinguir mayúsculas sobre el índice funcional emp_uname_idx
+    return active_employee_summaries().annotate(
+        name_upper=Upper('name')
+    ).get(name_upper=Upper(Value(name)))
+
+def _active_employee_index():
+    """
+    Índice en memoria de empleados activos por employee_id y nombre (minúsculas) para la
+    sincronización offline en lote.
+    Se guarda en la caché de Django bajo una clave derivada de MAX(updated_at) y del total
+    de empleados, así solo se reconstruye cuando algún empleado cambia.
+    Los nombres repetidos quedan como None para no elegir un empleado ambiguo.
+    """
+    stamp = Employee.objects.aggregate(last=Max('updated_at'), total=Count('id'))
+    last_update = stamp['last'].timestamp() if stamp['last'] else 0
+    key = f"emp_idx:{last_update}:{stamp['total']}"
+    
+    index = cache.get(key)
+    if index is None:
+        by_id = {}
+        by_name_lower = {}
+        employees = Employee.objects.filter(is_active=True).only(
+            'id', 'employee_id', 'name', 'rut', 'department'
+        )
+        for employee in employees:
+            by_id[employee.employee_id] = employee
+            name_key = employee.name.strip().lower()
+            if name_key in by_name_lower:
+                by_name_lower[name_key] = None
+            else:
+                by_name_lower[name_key] = employee
+        
+        index = {'by_id': by_id, 'by_name': by_name_lower}
+        cache.set(key, index, EMPLOYEE_INDEX_TTL)
+    
+    return index
 
 @api_view(['GET'])
+@cache_page(HEALTH_CHECK_CACHE_SECONDS)
 def health_check(request):
     """Estado del sistema balanceado"""
+    # Ambos conteos de empleados en una sola consulta
+    employee_stats = Employee.objects.filter(is_active=True).aggregate(
+        total=Count('id'),
+        with_faces=Count('id', filter=Q(has_face_registered=True))
+    )
     return Response({
         'status': 'OK',
         'message': 'Sistema de Reconocimiento Facial Balanceado - 5 Fotos',
         'timestamp': datetime.now().isoformat(),
-        'employees_count': Employee.objects.filter(is_active=True).count(),
-        'employees_with_faces': Employee.objects.filter(is_active=True, has_face_registered=True).count(),
+        'employees_count': employee_stats['total'],
+        'employees_with_faces': employee_stats['with_faces'],
         'attendance_today': AttendanceRecord.objects.filter(
             timestamp__date=timezone.now().date()
         ).count(),
@@ -289,24 +470,14 @@ def register_employee_face(request):
                 'suggestion': 'Toma las fotos con buena iluminación frontal y rostro completamente visible'
             }, status=400)
         
-        # Guardar fotos de muestra
-        for idx, photo in enumerate(photos[:ADVANCED_CONFIG['min_photos']]):
-            try:
-                if ',' in photo:
-                    photo = photo.split(',')[1]
-                
-                image_data = base64.b64decode(photo)
-                image = Image.open(io.BytesIO(image_data))
-                
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                path = os.path.join(FACE_IMAGES_DIR, f"{employee_id}_variation_{idx+1}.jpg")
-                image.save(path, 'JPEG', quality=90)
-            except:
-                pass
+        # Guardar fotos de muestra en segundo plano: nada de la respuesta depende de ellas
+        _IMAGE_SAVE_POOL.submit(
+            _persist_sample_photos, employee_id, photos[:ADVANCED_CONFIG['min_photos']]
+        )
         
-        # Actualizar empleado
+        # Actualizar empleado (encodings como float32 en base64 en lugar de listas JSON)
+        encodings = face_data.pop('encodings', [])
+        face_data['encodings_b64'] = pack_encodings(encodings)
         face_data['registration_date'] = datetime.now().isoformat()
         face_data['system_version'] = 'BALANCED_v1.0'
         face_data['rut'] = employee.rut
@@ -316,12 +487,13 @@ def register_employee_face(request):
             'min_confidence': ADVANCED_CONFIG['min_confidence']
         }
         
-        employee.face_encoding = json.dumps(face_data)
+        employee.face_encoding = dumps_face_data(face_data)
         employee.has_face_registered = True
         employee.face_registration_date = timezone.now()
         employee.face_quality_score = face_data.get('average_quality', 0.8)
         employee.face_variations_count = face_data['valid_photos']
         employee.save()
+        invalidate_encoding_cache()
         
         return Response({
             'success': True,
@@ -330,7 +502,7 @@ def register_employee_face(request):
                 'photos_processed': face_data['valid_photos'],
                 'quality_score': f"{face_data.get('average_quality', 0.8):.1%}",
                 'variations_count': face_data['valid_photos'],
-                'features_extracted': len(face_data.get('encodings', [])),
+                'features_extracted': len(encodings),
                 'system_mode': 'BALANCED',
                 'processing_time': 'Optimizado para velocidad',
                 'tolerance_level': 'Balanceado para uso real'
@@ -350,11 +522,12 @@ def register_employee_face(request):
             'message': f'Error: {str(e)}'
         }, status=500)
 
-@api_view(['POST'])
-def verify_attendance_face(request):
-    """Verificación facial balanceada con timeout reducido"""
+def _verify_face_impl(data):
+    """
+    Lógica de verificación facial independiente de DRF.
+    Retorna (status_code, body) para que la usen la vista y mark_attendance.
+    """
     try:
-        data = request.data
         photo_base64 = data.get('photo')
         attendance_type = data.get('type', 'entrada').lower()
         location_lat = data.get('latitude')
@@ -362,22 +535,52 @@ def verify_attendance_face(request):
         address = data.get('address', '')
         
         if not photo_base64:
-            return Response({
+            return 400, {
                 'success': False,
                 'message': 'Se requiere foto'
-            }, status=400)
+            }
+
+        # Decodificar una sola vez: el mismo arreglo RGB se usa para el filtro y la verificación
+        bgr_image = decode_base64_image(photo_base64)
+        if bgr_image is None:
+            return 400, {
+                'success': False,
+                'message': 'No se pudo decodificar la foto',
+                'error_type': 'INVALID_IMAGE'
+            }
+        
+        rgb_image = resize_to_max_side(
+            cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB),
+            ADVANCED_CONFIG['verification_max_side']
+        )
         
-        print(f"\n🔍 Iniciando verificación balanceada con timeout de {ADVANCED_CONFIG['verification_timeout']}s...")
+        # Filtros rápidos (desenfoque y presencia de rostro) antes del pipeline completo
+        gray_image = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        if face_recognition_service.is_too_blurry(gray_image):
+            return 400, {
+                'success': False,
+                'message': '📷 Imagen demasiado borrosa, intenta nuevamente',
+                'error_type': 'IMAGE_TOO_BLURRY',
+                'system_mode': 'BALANCED'
+            }
+        
+        if not face_recognition_service.has_face_candidate(gray_image):
+            return 400, {
+                'success': False,
+                'message': '🙂 No se detectó un rostro, mira directamente a la cámara',
+                'error_type': 'NO_FACE_DETECTED',
+                'system_mode': 'BALANCED'
+            }
+        
+        logger.debug("Iniciando verificación balanceada con timeout de %ss", ADVANCED_CONFIG['verification_timeout'])
         start_time = time.time()
         
-        verification_result, error = face_recognition_service.advanced_verify(
-            photo_base64
-        )
+        verification_result, error = face_recognition_service.advanced_verify(rgb_image)
         
         elapsed_time = time.time() - start_time
         
         if error and ("Timeout" in error or "TIMEOUT" in error):
-            return Response({
+            return 408, {
                 'success': False,
                 'message': '⏱️ VERIFICACIÓN CANCELADA - Tiempo límite excedido',
                 'timeout': True,
@@ -392,31 +595,31 @@ def verify_attendance_face(request):
                     "🎯 Centra tu rostro en la imagen",
                     "👓 Si usas lentes, verifica que estén limpios"
                 ]
-            }, status=408)
+            }
         
         if error:
-            return Response({
+            return 400, {
                 'success': False,
                 'message': f'❌ VERIFICACIÓN FALLIDA: {error}',
                 'elapsed_time': f'{elapsed_time:.1f}s',
                 'error_type': 'VERIFICATION_FAILED',
                 'system_mode': 'BALANCED'
-            }, status=400)
+            }
         
         if not verification_result:
-            return Response({
+            return 500, {
                 'success': False,
                 'message': 'Error interno procesando verificación',
                 'elapsed_time': f'{elapsed_time:.1f}s',
                 'system_mode': 'BALANCED'
-            }, status=500)
+            }
         
         best_match = verification_result.get('best_match')
         best_confidence = verification_result.get('best_confidence', 0)
         all_results = verification_result.get('all_results', [])
         
         if not best_match:
-            return Response({
+            return 403, {
                 'success': False,
                 'message': '🚫 ACCESO DENEGADO - Rostro no autorizado',
                 'error_type': 'UNAUTHORIZED',
@@ -430,35 +633,36 @@ def verify_attendance_face(request):
                     '🎯 Mirar directamente a la cámara',
                     f'📊 Confianza mínima requerida: {ADVANCED_CONFIG["min_confidence"]:.0%}'
                 ]
-            }, status=403)
-        
-        print(f"✅ VERIFICADO: {best_match['name']} ({best_confidence:.1%}) en {elapsed_time:.1f}s")
+            }
         
-        # Buscar el objeto Employee por el best_match
-        try:
-            employee_obj = Employee.objects.get(id=best_match['id'], is_active=True)
-        except Employee.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Error: Empleado verificado no encontrado en base de datos',
-                'error_type': 'DATA_INCONSISTENCY'
-            }, status=500)
+        logger.info("VERIFICADO: %s (%.1f%%) en %.1fs", best_match['name'], best_confidence * 100, elapsed_time)
         
-        attendance_record = AttendanceRecord.objects.create(
-            employee=employee_obj,
-            attendance_type=attendance_type,
-            timestamp=timezone.now(),
-            location_lat=location_lat,
-            location_lng=location_lng,
-            address=address,
-            verification_method='facial',
-            face_confidence=best_confidence,
-            notes=f'Verificación facial balanceada ({best_confidence:.1%}) - {elapsed_time:.1f}s'
-        )
+        # Lectura del empleado e inserción del registro en una sola transacción
+        with transaction.atomic():
+            try:
+                employee_obj = active_employee_summaries().get(id=best_match['id'])
+            except Employee.DoesNotExist:
+                return 500, {
+                    'success': False,
+                    'message': 'Error: Empleado verificado no encontrado en base de datos',
+                    'error_type': 'DATA_INCONSISTENCY'
+                }
+            
+            attendance_record = AttendanceRecord.objects.create(
+                employee=employee_obj,
+                attendance_type=attendance_type,
+                timestamp=timezone.now(),
+                location_lat=location_lat,
+                location_lng=location_lng,
+                address=address,
+                verification_method='facial',
+                face_confidence=best_confidence,
+                notes=f'Verificación facial balanceada ({best_confidence:.1%}) - {elapsed_time:.1f}s'
+            )
         
         serializer = AttendanceRecordSerializer(attendance_record)
         
-        return Response({
+        return 200, {
             'success': True,
             'message': f'✅ {attendance_type.upper()} REGISTRADA',
             'employee': {
@@ -477,21 +681,22 @@ def verify_attendance_face(request):
             },
             'record': serializer.data,
             'timestamp': timezone.now().strftime('%d/%m/%Y %H:%M:%S')
-        })
+        }
         
     except Exception as e:
-        return Response({
+        return 500, {
             'success': False,
             'message': f'Error crítico: {str(e)}',
             'error_type': 'SYSTEM_ERROR',
             'system_mode': 'BALANCED'
-        }, status=500)
+        }
 
-@api_view(['POST'])
-def verify_qr(request):
-    """Verificar asistencia por código QR + RUT"""
+def _verify_qr_impl(data):
+    """
+    Lógica de verificación por QR independiente de DRF.
+    Retorna (status_code, body) para que la usen la vista y mark_attendance.
+    """
     try:
-        data = request.data
         qr_data = data.get('qr_data', '').strip()
         attendance_type = data.get('type', 'entrada').lower()
         location_lat = data.get('latitude')
@@ -499,65 +704,67 @@ def verify_qr(request):
         address = data.get('address', '')
         
         if not qr_data:
-            return Response({
+            return 400, {
                 'success': False,
                 'message': 'Código QR requerido'
-            }, status=400)
+            }
         
-        print(f"\n🆔 Verificando QR: {qr_data}")
+        logger.debug("Verificando QR: %s", qr_data)
         
         # Extraer RUT del código QR con múltiples estrategias
         rut_from_qr = None
         
-        # Estrategia 1: Buscar patrón de RUT en el texto
-        import re
-        rut_pattern = r'(\d{7,8}[-]?[0-9kK])'
-        rut_matches = re.findall(rut_pattern, qr_data, re.IGNORECASE)
-        
-        if rut_matches:
-            rut_from_qr = rut_matches[0]
-            print(f"RUT encontrado por patrón: {rut_from_qr}")
+        # Caso más común: el QR contiene solo el RUT (con o sin puntos y guión)
+        direct_rut = RUT_QR_CLEAN_RE.sub('', qr_data).upper()
+        if validate_chilean_rut(direct_rut):
+            rut_from_qr = direct_rut
+            logger.debug("RUT directo en el QR: %s", rut_from_qr)
         else:
+            # Estrategia 1: Buscar patrón de RUT en el texto
+            rut_match = RUT_IN_TEXT_RE.search(qr_data)
+            if rut_match:
+                rut_from_qr = rut_match.group(1)
+                logger.debug("RUT encontrado por patrón: %s", rut_from_qr)
+        
+        if not rut_from_qr:
             # Estrategia 2: Intentar como JSON
             try:
                 qr_json = json.loads(qr_data)
                 rut_from_qr = qr_json.get('rut') or qr_json.get('RUT') or qr_json.get('run') or qr_json.get('RUN')
             except:
                 # Estrategia 3: Asumir que el QR contiene directamente el RUT
-                clean_data = re.sub(r'[^0-9kK-]', '', qr_data).upper()
-                if len(clean_data) >= 8:
-                    rut_from_qr = clean_data
+                if len(direct_rut) >= 8:
+                    rut_from_qr = direct_rut
                 else:
                     # Estrategia 4: Buscar cualquier secuencia de números seguida de dígito
-                    number_pattern = r'(\d{7,8}[0-9kK])'
-                    number_matches = re.findall(number_pattern, qr_data, re.IGNORECASE)
-                    if number_matches:
-                        rut_from_qr = number_matches[0]
+                    number_match = RUT_DIGITS_RE.search(qr_data)
+                    if number_match:
+                        rut_from_qr = number_match.group(1)
         
         if not rut_from_qr:
-            return Response({
+            return 400, {
                 'success': False,
                 'message': f'No se pudo extraer RUT del código QR. Contenido: {qr_data[:50]}...'
-            }, status=400)
+            }
         
         # Formatear RUT para búsqueda
         formatted_rut = format_rut_for_storage(rut_from_qr)
-        print(f"RUT formateado: {formatted_rut}")
+        logger.debug("RUT formateado: %s", formatted_rut)
         
         # Validar RUT
         if not validate_chilean_rut(formatted_rut):
-            return Response({
+            return 400, {
                 'success': False,
                 'message': f'RUT extraído del QR no es válido: {formatted_rut}'
-            }, status=400)
+            }
         
         # Buscar empleado por RUT
         employee = search_employee_by_rut(formatted_rut)
         if not employee:
-            return Response({
+            return 404, {
                 'success': False,
                 'message': f'Empleado con RUT {formatted_rut} no encontrado en el sistema'
-            }, status=404)
+            }
         
         # Crear registro de asistencia
         attendance_record = AttendanceRecord.objects.create(
@@ -574,7 +781,7 @@ def verify_qr(request):
         
         serializer = AttendanceRecordSerializer(attendance_record)
         
-        return Response({
+        return 200, {
             'success': True,
             'message': f'✅ {attendance_type.upper()} REGISTRADA VIA QR',
             'employee': {
@@ -592,14 +799,26 @@ def verify_qr(request):
             },
             'record': serializer.data,
             'timestamp': timezone.now().strftime('%d/%m/%Y %H:%M:%S')
-        })
+        }
         
     except Exception as e:
-        return Response({
+        return 500, {
             'success': False,
             'message': f'Error verificando QR: {str(e)}',
             'error_type': 'QR_VERIFICATION_ERROR'
-        }, status=500)
+        }
+
+@api_view(['POST'])
+def verify_attendance_face(request):
+    """Verificación facial balanceada con timeout reducido"""
+    status_code, body = _verify_face_impl(request.data)
+    return Response(body, status=status_code)
+
+@api_view(['POST'])
+def verify_qr(request):
+    """Verificar asistencia por código QR + RUT"""
+    status_code, body = _verify_qr_impl(request.data)
+    return Response(body, status=status_code)
 
 @api_view(['POST'])
 def mark_attendance(request):
@@ -608,10 +827,12 @@ def mark_attendance(request):
         data = request.data
         
         if data.get('photo'):
-            return verify_attendance_face(request)
+            status_code, body = _verify_face_impl(data)
+            return Response(body, status=status_code)
         
         if data.get('qr_data'):
-            return verify_qr(request)
+            status_code, body = _verify_qr_impl(data)
+            return Response(body, status=status_code)
         
         # Lógica de búsqueda de empleado
         employee_name = data.get('employee_name', '').strip()
@@ -620,13 +841,13 @@ def mark_attendance(request):
         employee = None
         if employee_id:
             try:
-                employee = Employee.objects.get(employee_id=employee_id, is_active=True)
+                employee = active_employee_summaries().get(employee_id=employee_id)
             except Employee.DoesNotExist:
                 pass
         
         if not employee and employee_name:
             try:
-                employee = Employee.objects.get(name__icontains=employee_name, is_active=True)
+                employee = search_employee_by_name(employee_name)
             except Employee.DoesNotExist:
                 pass
             except Employee.MultipleObjectsReturned:
@@ -642,7 +863,7 @@ def mark_attendance(request):
             }, status=400)
         
         # Llamada a la función auxiliar
-        attendance_record = _create_manual_attendance_record(
+        attendance_record, created = _create_manual_attendance_record(
             employee=employee,
             attendance_type=data.get('type', 'entrada').lower(),
             location_lat=data.get('latitude'),
@@ -657,7 +878,11 @@ def mark_attendance(request):
         
         return Response({
             'success': True,
-            'message': f'✅ {attendance_record.attendance_type.upper()} registrada manualmente',
+            'message': (
+                f'✅ {attendance_record.attendance_type.upper()} registrada manualmente' if created
+                else f'✅ {attendance_record.attendance_type.upper()} ya estaba registrada'
+            ),
+            'duplicate': not created,
             'record': serializer.data,
             'employee': {
                 'id': str(employee.id),
@@ -672,35 +897,117 @@ def mark_attendance(request):
     except Exception as e:
         return Response({'success': False, 'message': f'Error: {str(e)}'}, status=500)
 
+def _save_offline_manual_records(pending_records, pending_local_ids, add_error):
+    """
+    Guarda los registros manuales de una sincronización en una sola transacción.
+    Descarta antes los reenvíos ya guardados (misma clave empleado/hora/tipo) con una sola
+    consulta e intenta un bulk_create; si el lote falla, reintenta registro por registro con
+    un SAVEPOINT cada uno para que un registro inválido no descarte a los demás.
+    Retorna (guardados, duplicados) y reporta los registros rechazados con `add_error`.
+    """
+    timestamps = [record.timestamp for record in pending_records]
+    seen_keys = set(
+        AttendanceRecord.objects.filter(
+            employee_id__in={record.employee_id for record in pending_records},
+            timestamp__range=(min(timestamps), max(timestamps))
+        ).values_list('employee_id', 'timestamp', 'attendance_type')
+    )
+    
+    new_records = []
+    new_local_ids = []
+    duplicate_count = 0
+    for record, local_id in zip(pending_records, pending_local_ids):
+        key = (record.employee_id, record.timestamp, record.attendance_type)
+        if key in seen_keys:
+            duplicate_count += 1
+            logger.debug("Registro manual %s ya sincronizado; se omite", local_id)
+            continue
+        seen_keys.add(key)
+        new_records.append(record)
+        new_local_ids.append(local_id)
+    
+    if not new_records:
+        return 0, duplicate_count
+    
+    try:
+        with transaction.atomic():
+            AttendanceRecord.objects.bulk_create(new_records, batch_size=OFFLINE_BULK_BATCH_SIZE)
+            # bulk_create no emite post_save: se invalida a mano el ETag de get_employees
+            bump_employee_list_version()
+        logger.debug("%d registros manuales sincronizados", len(new_records))
+        return len(new_records), duplicate_count
+    except Exception as e:
+        logger.warning("Falló la inserción en lote (%s); reintentando registro por registro", e)
+    
+    saved_count = 0
+    with transaction.atomic():
+        for record, local_id in zip(new_records, new_local_ids):
+            try:
+                with transaction.atomic():
+                    record.save(force_insert=True)
+                saved_count += 1
+            except Exception as e:
+                add_error(local_id, f'Excepción: {str(e)}')
+                logger.warning("Error al guardar registro manual %s: %s", local_id, e)
+    return saved_count, duplicate_count
+
+def _sync_verify_record(record_data):
+    """
+    Verifica un registro offline con foto o QR dentro del pool de sincronización.
+    Retorna (status_code, body) y cierra la conexión a la BD que abrió el hilo.
+    """
+    try:
+        logger.debug("Procesando registro %s", record_data.get('local_id'))
+        if record_data.get('photo'):
+            return _verify_face_impl(record_data)
+        return _verify_qr_impl(record_data)
+    except Exception as e:
+        return 500, {'success': False, 'message': f'Excepción: {str(e)}'}
+    finally:
+        connections.close_all()
+
 @api_view(['POST'])
 def sync_offline_records(request):
     """Sincronizar registros offline"""
     try:
         offline_records = request.data.get('offline_records', [])
+        
+        max_records = getattr(settings, 'MAX_OFFLINE_SYNC', 5000)
+        if len(offline_records) > max_records:
+            logger.warning(
+                "Sincronización rechazada: %d registros (máximo %d) desde %s",
+                len(offline_records), max_records, request.META.get('REMOTE_ADDR')
+            )
+            return Response({
+                'success': False,
+                'message': f'Lote demasiado grande; máximo {max_records} registros por sincronización'
+            }, status=413)
+        
         synced_count = 0
+        # Solo se conservan los primeros errores para la respuesta; el resto solo se cuenta
+        error_count = 0
         errors = []
+        
+        def add_error(local_id, message):
+            nonlocal error_count
+            error_count += 1
+            if len(errors) < MAX_SYNC_ERRORS_KEPT:
+                errors.append({'local_id': local_id, 'error': message})
 
-        print(f"🔄 Iniciando sincronización de {len(offline_records)} registros offline...")
+        logger.info("Iniciando sincronización de %d registros offline", len(offline_records))
+        
+        employee_index = _active_employee_index()
+        employees_by_id = employee_index['by_id']
+        employees_by_name = employee_index['by_name']
+        pending_records = []
+        pending_local_ids = []
+        verify_records = []
         
         for record_data in offline_records:
             try:
-                response = None
-                
-                if record_data.get('photo'):
-                    print(f"   Procesando registro facial...")
-                    mock_request = HttpRequest()
-                    mock_request.method = 'POST'
-                    mock_request._body = json.dumps(record_data).encode('utf-8')
-                    mock_request.content_type = 'application/json'
-                    response = verify_attendance_face(mock_request)
-
-                elif record_data.get('qr_data'):
-                    print(f"   Procesando registro QR...")
-                    mock_request = HttpRequest()
-                    mock_request.method = 'POST'
-                    mock_request._body = json.dumps(record_data).encode('utf-8')
-                    mock_request.content_type = 'application/json'
-                    response = verify_qr(mock_request)
+                if record_data.get('photo') or record_data.get('qr_data'):
+                    # Foto/QR son independientes entre sí: se verifican en paralelo más abajo
+                    verify_records.append(record_data)
                 
                 else:
                     employee_id = record_data.get('employee_id')
@@ -708,92 +1015,137 @@ def sync_offline_records(request):
                     
                     employee_obj = None
                     if employee_id:
-                        try:
-                            employee_obj = Employee.objects.get(employee_id=employee_id, is_active=True)
-                        except Employee.DoesNotExist:
-                            pass
+                        employee_obj = employees_by_id.get(employee_id)
                     
                     if not employee_obj and employee_name:
-                        try:
-                            employee_obj = Employee.objects.get(name__icontains=employee_name, is_active=True)
-                        except (Employee.DoesNotExist, Employee.MultipleObjectsReturned):
-                            pass
+                        employee_obj = employees_by_name.get(employee_name.strip().lower())
                             
                     if not employee_obj:
                         error_msg = 'Empleado no encontrado para la sincronización'
-                        errors.append({'local_id': record_data.get('local_id'), 'error': error_msg, 'data': record_data})
-                        print(f"   ❌ Fallo al sincronizar: {error_msg} para ID/nombre {employee_id}/{employee_name}")
+                        add_error(record_data.get('local_id'), error_msg)
+                        logger.warning("Fallo al sincronizar: %s para ID/nombre %s/%s", error_msg, employee_id, employee_name)
+                        continue
+                    
+                    attendance_type = record_data.get('type', 'entrada')
+                    if attendance_type not in VALID_ATTENDANCE_TYPES:
+                        add_error(record_data.get('local_id'), f'Tipo de asistencia inválido: {attendance_type}')
+                        logger.warning("Fallo al sincronizar %s: tipo %r inválido", record_data.get('local_id'), attendance_type)
                         continue
                     
-                    print(f"   Procesando registro manual de {employee_obj.name}...")
+                    logger.debug("Procesando registro manual de %s", employee_obj.name)
                     
-                    _create_manual_attendance_record(
+                    # Los registros manuales se insertan juntos al final con bulk_create
+                    pending_records.append(_build_manual_attendance_record(
                         employee=employee_obj,
-                        attendance_type=record_data.get('type', 'entrada'),
+                        attendance_type=attendance_type,
                         location_lat=record_data.get('latitude'),
                         location_lng=record_data.get('longitude'),
                         address=record_data.get('address', ''),
                         notes='Sincronizado offline',
                         is_offline_sync=True,
                         offline_timestamp=record_data.get('timestamp')
-                    )
-                    synced_count += 1
-                    print(f"   ✅ Sincronizado exitosamente.")
+                    ))
+                    pending_local_ids.append(record_data.get('local_id'))
 
-                # Procesar la respuesta para los métodos de foto y QR
-                if response:
-                    if response.status_code in [200, 201]:
+            except Exception as e:
+                add_error(record_data.get('local_id', 'unknown'), f'Excepción: {str(e)}')
+                logger.warning("Error al procesar registro %s: %s", record_data.get('local_id', 'unknown'), e)
+        
+        if verify_records:
+            workers = min(SYNC_VERIFY_WORKERS, len(verify_records))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_sync_verify_record, verify_records)
+                # Procesar el resultado para los métodos de foto y QR (en el orden original)
+                for record_data, (status_code, body) in zip(verify_records, results):
+                    if status_code in [200, 201]:
                         synced_count += 1
-                        print(f"   ✅ Sincronizado exitosamente.")
+                        logger.debug("Registro %s sincronizado", record_data.get('local_id'))
                     else:
-                        error_msg = response.data.get('message', 'Error desconocido')
-                        errors.append({'local_id': record_data.get('local_id'), 'error': error_msg})
-                        print(f"   ❌ Fallo al sincronizar: {error_msg}")
-
-            except Exception as e:
-                errors.append({'local_id': record_data.get('local_id', 'unknown'), 'error': f'Excepción: {str(e)}'})
-                print(f"   ❌ Error al procesar registro: {str(e)}")
+                        error_msg = body.get('message', 'Error desconocido')
+                        add_error(record_data.get('local_id'), error_msg)
+                        logger.warning("Fallo al sincronizar %s: %s", record_data.get('local_id'), error_msg)
+        
+        duplicate_count = 0
+        if pending_records:
+            saved_count, duplicate_count = _save_offline_manual_records(
+                pending_records, pending_local_ids, add_error
+            )
+            synced_count += saved_count
         
-        print(f"🏁 Sincronización finalizada. Total: {synced_count}/{len(offline_records)} exitosos.")
+        logger.info("Sincronización finalizada. Total: %d/%d exitosos", synced_count, len(offline_records))
         
         return Response({
             'success': True,
             'synced_count': synced_count,
-            'error_count': len(errors),
-            'errors': errors[:10],
-            'message': f'Sincronizados {synced_count} de {len(offline_records)} registros',
+            'duplicate_count': duplicate_count,
+            'error_count': error_count,
+            'errors': errors,
+            'message': f'Sincronizados {synced_count} de {len(offline_records)} registros ({duplicate_count} ya existentes)',
             'system_mode': 'BALANCED'
         })
         
     except Exception as e:
         return Response({'success': False, 'message': f'Error crítico en la sincronización: {str(e)}'}, status=500)
 
+def _build_employees_payload():
+    """Cuerpo de la respuesta de get_employees: lista serializada y estadísticas de registro facial"""
+    # Una sola consulta con el conteo de asistencias anotado
+    employees = list(
+        active_employees_lite()
+        .annotate(attendance_total=Count('attendance_records'))
+        .order_by('name')
+    )
+    serializer = EmployeeSerializer(employees, many=True)
+    
+    total_employees = len(employees)
+    employees_with_faces = sum(1 for employee in employees if employee.has_face_registered)
+    
+    return {
+        'success': True,
+        'employees': serializer.data,
+        'count': total_employees,
+        'employees_with_faces': employees_with_faces,
+        'face_registration_rate': f"{(employees_with_faces/total_employees*100):.1f}%" if total_employees > 0 else "0%",
+        'system_mode': 'BALANCED_FACIAL_RECOGNITION',
+        'features': {
+            'basic_registration': True,
+            'balanced_facial_recognition': True,
+            'photos_required': ADVANCED_CONFIG['min_photos'],
+            'qr_verification': True,
+            'offline_sync': True,
+            'optimized_processing': True
+        }
+    }
+
+def _employees_etag():
+    """
+    ETag de la lista de empleados: versión persistida en DataVersion que suben las señales
+    (y los caminos en lote sin señales) al crear, editar o eliminar empleados o asistencias
+    """
+    return quote_etag(f"emp-{get_employee_list_version()}")
+
 @api_view(['GET'])
+@renderer_classes([ORJSONRenderer])
 def get_employees(request):
     """Obtener empleados"""
     try:
-        employees = Employee.objects.filter(is_active=True).order_by('name')
-        serializer = EmployeeSerializer(employees, many=True)
-        
-        total_employees = employees.count()
-        employees_with_faces = employees.filter(has_face_registered=True).count()
-        
-        return Response({
-            'success': True,
-            'employees': serializer.data,
-            'count': total_employees,
-            'employees_with_faces': employees_with_faces,
-            'face_registration_rate': f"{(employees_with_faces/total_employees*100):.1f}%" if total_employees > 0 else "0%",
-            'system_mode': 'BALANCED_FACIAL_RECOGNITION',
-            'features': {
-                'basic_registration': True,
-                'balanced_facial_recognition': True,
-                'photos_required': ADVANCED_CONFIG['min_photos'],
-                'qr_verification': True,
-                'offline_sync': True,
-                'optimized_processing': True
-            }
-        })
+        # GET condicional: si nada cambió desde la última consulta del panel se responde 304
+        # sin leer ni serializar la lista completa
+        etag = _employees_etag()
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        
+        # El mismo estado (ETag) ya serializado por otro cliente se reutiliza desde la caché
+        cache_key = f"emp_list:{etag}"
+        payload = cache.get(cache_key)
+        if payload is None:
+            payload = _build_employees_payload()
+            cache.set(cache_key, payload, EMPLOYEE_LIST_CACHE_TTL)
+        
+        response = Response(payload)
+        response['ETag'] = etag
+        return response
         
     except Exception as e:
         return Response({
@@ -801,44 +1153,131 @@ def get_employees(request):
             'message': f'Error: {str(e)}'
         }, status=500)
 
+def _stream_attendance_records(queryset, chunk_size=2000):
+    """Genera el JSON {"success": true, "records": [...]} registro a registro"""
+    yield '{"success": true, "records": ['
+    first = True
+    for record in queryset.iterator(chunk_size=chunk_size):
+        payload = json.dumps(AttendanceRecordSerializer(record).data, default=str)
+        yield payload if first else ',' + payload
+        first = False
+    yield ']}'
+
+def _parse_attendance_cursor(cursor):
+    """Cursor '<timestamp ISO>_<uuid>' de get_attendance_records -> (datetime, UUID); ValueError si es inválido"""
+    # Un '+' de zona horaria sin codificar en la URL llega como espacio
+    timestamp_text, _, record_id = cursor.replace(' ', '+').rpartition('_')
+    cursor_timestamp = parse_datetime(timestamp_text)
+    if cursor_timestamp is None:
+        raise ValueError(f"Timestamp de cursor inválido: {timestamp_text}")
+    return cursor_timestamp, uuid.UUID(record_id)
+
 @api_view(['GET'])
+@renderer_classes([ORJSONRenderer])
 def get_attendance_records(request):
     """Obtener registros"""
     try:
         days = int(request.GET.get('days', 7))
         employee_id = request.GET.get('employee_id')
-        limit = int(request.GET.get('limit', 100))
-        
-        date_from = timezone.now().date() - timedelta(days=days)
-        queryset = AttendanceRecord.objects.select_related('employee').filter(
-            timestamp__date__gte=date_from
-        ).order_by('-timestamp')
+        try:
+            limit = int(request.GET.get('limit', 100))
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'El parámetro limit debe ser un número entero'
+            }, status=400)
+        limit = max(limit, 1)
+        
+        # Comparación directa contra la medianoche local (no DATE(timestamp)) para que
+        # el motor recorra el índice de timestamp por rango
+        date_from = timezone.localdate() - timedelta(days=days)
+        cutoff = timezone.make_aware(datetime.combine(date_from, datetime.min.time()))
+        queryset = AttendanceRecord.objects.select_related('employee').only(
+            *ATTENDANCE_RECORD_LIST_FIELDS
+        ).filter(
+            timestamp__gte=cutoff
+        ).order_by('-timestamp', '-id')
         
         if employee_id:
+            # Filtrar directo por la FK evita un SELECT extra sobre Employee; un id que
+            # no es UUID se ignora sin consultar la BD (antes terminaba en error 500)
             try:
-                employee = Employee.objects.get(id=employee_id)
-                queryset = queryset.filter(employee=employee)
-            except Employee.DoesNotExist:
+                queryset = queryset.filter(employee_id=uuid.UUID(employee_id))
+            except ValueError:
                 pass
         
-        total_count = queryset.count()
-        records = queryset[:limit]
-        serializer = AttendanceRecordSerializer(records, many=True)
+        if request.GET.get('stream') == '1':
+            # Exportaciones grandes: se serializa fila a fila sin materializar la lista completa
+            return StreamingHttpResponse(
+                _stream_attendance_records(queryset[:limit]),
+                content_type='application/json'
+            )
+        
+        # Las páginas JSON tienen un tamaño máximo; la exportación en streaming no
+        limit = min(limit, MAX_ATTENDANCE_PAGE_SIZE)
+        
+        # Paginación por cursor (keyset): la página siguiente empieza bajo el último
+        # (timestamp, id) entregado, sin OFFSET, recorriendo el índice de timestamp
+        cursor = request.GET.get('cursor')
+        page_queryset = queryset
+        if cursor:
+            try:
+                cursor_timestamp, cursor_id = _parse_attendance_cursor(cursor)
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'message': 'Cursor de paginación inválido'
+                }, status=400)
+            page_queryset = queryset.filter(
+                Q(timestamp__lt=cursor_timestamp) |
+                Q(timestamp=cursor_timestamp, id__lt=cursor_id)
+            )
+        
+        # Se pide un registro extra para saber si hay más sin ejecutar COUNT(*)
+        records = list(page_queryset[:limit + 1])
+        has_more = len(records) > limit
+        records = records[:limit]
+        next_cursor = (
+            f"{records[-1].timestamp.isoformat()}_{records[-1].id}" if has_more and records else None
+        )
+        
+        if request.GET.get('with_total') == '1':
+            # Total y desglose por método de todo el rango en un único GROUP BY, resuelto
+            # sobre el índice (timestamp, verification_method)
+            counts = {
+                row['verification_method']: row['c']
+                for row in queryset.order_by().values('verification_method').annotate(c=Count('id'))
+            }
+            stats = {
+                'total': sum(counts.values()),
+                'facial': counts.get('facial', 0),
+                'qr': counts.get('qr', 0),
+                'manual': counts.get('manual', 0),
+            }
+        else:
+            # Desglose de la página en una pasada sobre la lista ya materializada (es el del
+            # rango completo en una primera página sin más registros)
+            counts = Counter(r.verification_method for r in records)
+            stats = {
+                'total': len(records) if not has_more and not cursor else None,
+                'facial': counts['facial'],
+                'qr': counts['qr'],
+                'manual': counts['manual'],
+            }
         
-        # Estadísticas adicionales
-        facial_records = records.filter(verification_method='facial').count()
-        qr_records = records.filter(verification_method='qr').count()
-        manual_records = records.filter(verification_method='manual').count()
+        serializer = AttendanceRecordSerializer(records, many=True)
         
         return Response({
             'success': True,
             'records': serializer.data,
             'count': len(serializer.data),
-            'total': total_count,
+            'total': stats['total'],
+            'has_more': has_more,
+            'next_cursor': next_cursor,
             'statistics': {
-                'facial_recognitions': facial_records,
-                'qr_verifications': qr_records,
-                'manual_entries': manual_records
+                'facial_recognitions': stats['facial'],
+                'qr_verifications': stats['qr'],
+                'manual_entries': stats['manual']
             },
             'system_info': {
                 'balanced_face_registration': True,
@@ -859,17 +1298,22 @@ def get_attendance_records(request):
 def delete_employee(request, employee_id):
     """Eliminar empleado completamente"""
     try:
-        employee = Employee.objects.get(id=employee_id)
-        employee_name = employee.name
-        
-        # Eliminar fotos guardadas si existen
-        for i in range(1, ADVANCED_CONFIG['min_photos'] + 1):
-            path = os.path.join(FACE_IMAGES_DIR, f"{employee_id}_variation_{i}.jpg")
-            if os.path.exists(path):
-                os.remove(path)
-        
-        AttendanceRecord.objects.filter(employee=employee).delete()
-        employee.delete()
+        with transaction.atomic():
+            # Bloquea la fila: dos eliminaciones concurrentes del mismo empleado se serializan
+            employee = Employee.objects.select_for_update().only('id', 'name').get(id=employee_id)
+            employee_name = employee.name
+            
+            # Las fotos se borran solo si la transacción se confirma; un error de disco
+            # se registra en el log sin afectar la respuesta (robust)
+            transaction.on_commit(partial(_purge_employee_photos, employee_id), robust=True)
+            
+            # DELETE directos sin Collector (AttendanceRecord es lo único que referencia a
+            # Employee); como no emiten post_delete, la versión de la lista se sube a mano
+            records = AttendanceRecord.objects.filter(employee_id=employee.id)
+            records._raw_delete(records.db)
+            employee_rows = Employee.objects.filter(pk=employee.pk)
+            employee_rows._raw_delete(employee_rows.db)
+            bump_employee_list_version()
         
         return Response({
             'success': True,
@@ -891,29 +1335,38 @@ def delete_employee(request, employee_id):
 def delete_attendance(request, attendance_id):
     """Eliminar registro de asistencia"""
     try:
-        attendance_record = AttendanceRecord.objects.get(id=attendance_id)
-        employee_name = attendance_record.employee.name
-        attendance_type = attendance_record.attendance_type
-        timestamp = attendance_record.timestamp.strftime('%d/%m/%Y %H:%M')
+        # Solo las columnas del mensaje, con el nombre del empleado en el mismo JOIN
+        record = AttendanceRecord.objects.filter(id=attendance_id).values(
+            'employee__name', 'attendance_type', 'timestamp'
+        ).first()
+        if record is None:
+            return Response({
+                'success': False,
+                'message': 'Registro no encontrado'
+            }, status=404)
         
-        attendance_record.delete()
+        AttendanceRecord.objects.filter(id=attendance_id).delete()
         
+        timestamp = record['timestamp'].strftime('%d/%m/%Y %H:%M')
         return Response({
             'success': True,
-            'message': f'Registro eliminado: {employee_name} - {attendance_type} - {timestamp}'
+            'message': f"Registro eliminado: {record['employee__name']} - {record['attendance_type']} - {timestamp}"
         })
         
-    except AttendanceRecord.DoesNotExist:
-        return Response({
-            'success': False,
-            'message': 'Registro no encontrado'
-        }, status=404)
     except Exception as e:
         return Response({
             'success': False,
             'message': f'Error: {str(e)}'
         }, status=500)
 
+# El panel es HTML estático: se renderiza una sola vez y la respuesta comprimida queda en caché
+_PANEL_HTML = None
+
+@cache_page(PANEL_CACHE_SECONDS)
+@gzip_page
 def attendance_panel(request):
     """Panel web"""
-    return render(request, 'attendance_panel.html')
\ No newline at end of file
+    global _PANEL_HTML
+    if _PANEL_HTML is None:
+        _PANEL_HTML = render_to_string('attendance_panel.html')
+    return HttpResponse(_PANEL_HTML)
\ No newline at end of file